@@ -1,30 +1,59 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, update, delete, func, tuple_, bindparam, case, not_
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
+import asyncio
 import math
 
-from ...core.database import get_db
-from ...core.security import get_admin_user, get_password_hash
+from ...core.database import get_async_db, create_async_session
+from ...core.security import get_admin_user, get_password_hash_async, password_hasher
 from ...core.config import settings
 from ...core.file_utils import AvatarManager
+from ...core.user_cache import user_cache
+from ...core.token_versions import token_versions
+from ...core.pagination import encode_cursor, decode_cursor
+from ...core.audit_export import EXPORT_COLUMNS, stream_audit_logs
+from ...core.serialization import json_response
+from ...core.etag import make_etag, etag_matches, etag_headers, not_modified
+from ...core.table_versions import track_table_version, get_table_version
 from ...models.user import User
 from ...models.audit_log import AuditLog
-from ...schemas.user import UserResponse, AdminPasswordReset
-from ...schemas.audit_log import AuditLogResponse, AuditLogListResponse
+from ...models.audit_rollup import AuditLogHourlyRollup, AuditLogIpDailyRollup, AuditLogActionTotal
+from ...schemas.user import (
+    UserResponse, AdminPasswordReset, BulkUserIds, BulkActiveUpdate, BulkPasswordReset,
+    BulkResultItem, BulkOperationResponse, USER_RESPONSE_FIELDS, user_row_to_dict
+)
+from ...schemas.audit_log import (
+    AuditLogListResponse, AuditStatsResponse, AuditActionCount, AuditHourlyCount, AuditIpCount
+)
 
 router = APIRouter()
 
+# users 的任何新增、修改、刪除都會遞增 table_versions 中的版本，作為列表 ETag
+track_table_version(User)
+
 UPLOAD_DIR = Path(__file__).parent.parent.parent.parent / settings.UPLOAD_DIR / "avatars"
 
 
+# 列表只投影 UserResponse 需要的欄位，不建立 ORM 物件也不經過 identity map
+USER_LIST_COLUMNS = tuple(getattr(User, name) for name in USER_RESPONSE_FIELDS)
+
+
 @router.get("/users", response_model=List[UserResponse])
-def get_all_users(
+async def get_all_users(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="上一頁回應標頭 X-Next-Cursor 的值，提供時改用 keyset 分頁"),
+    role: Optional[str] = Query(None),
+    is_active: Optional[bool] = Query(None),
+    created_after: Optional[datetime] = Query(None),
+    created_before: Optional[datetime] = Query(None),
     admin: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if skip < 0:
         raise HTTPException(
@@ -37,17 +66,207 @@ def get_all_users(
             detail="limit 參數必須在 1 到 1000 之間"
         )
 
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
+    # 只讀取 table_versions 的一列判斷 users 是否有變動，不掃描 users
+    # 瀏覽器依 URL 分別快取，篩選與分頁參數不需要放進 ETag
+    etag = make_etag("users", await get_table_version(db, "users"))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    query = select(*USER_LIST_COLUMNS)
+
+    if role:
+        query = query.where(User.role == role)
+    if is_active is not None:
+        query = query.where(User.is_active == is_active)
+    if created_after:
+        query = query.where(User.created_at >= created_after)
+    if created_before:
+        query = query.where(User.created_at < created_before)
+
+    query = query.order_by(User.created_at, User.id)
+
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.where(tuple_(User.created_at, User.id) > tuple_(cursor_created_at, cursor_id))
+    else:
+        query = query.offset(skip)
+
+    users = (await db.execute(query.limit(limit + 1))).all()
+
+    # 為了相容既有前端，回應本體維持陣列，下一頁游標放在標頭
+    headers = etag_headers(etag)
+    if len(users) > limit:
+        users = users[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(users[-1].created_at, users[-1].id)
+
+    # 投影的列直接編碼成 JSON，不建立 UserResponse；結構由 user_row_to_dict 保證與 response_model 一致
+    return json_response([user_row_to_dict(row) for row in users], headers)
+
+
+# ==================== 批次操作 ====================
+# 需宣告在 /users/{user_id}/... 之前，否則 bulk 會被當成 user_id 比對
+# 每個批次只有一個交易：以 WHERE id IN (...) 的集合式 SQL 一次處理，回傳每個 id 的結果
+
+
+def _exclude_self(user_ids: List[int], admin: User, detail: str) -> tuple[List[int], dict]:
+    errors = {admin.id: ("forbidden", detail)} if admin.id in user_ids else {}
+    return [user_id for user_id in user_ids if user_id not in errors], errors
+
+
+def _bulk_report(user_ids: List[int], succeeded: set, errors: dict) -> BulkOperationResponse:
+    results = []
+    for user_id in user_ids:
+        if user_id in succeeded:
+            results.append(BulkResultItem(user_id=user_id, status="ok"))
+        else:
+            result_status, detail = errors.get(user_id, ("not_found", "用戶不存在"))
+            results.append(BulkResultItem(user_id=user_id, status=result_status, detail=detail))
+
+    return BulkOperationResponse(
+        succeeded=len(succeeded),
+        failed=len(user_ids) - len(succeeded),
+        results=results
+    )
+
+
+async def _delete_unreferenced_avatars(avatar_paths: List[str]) -> None:
+    # 回應送出後才執行，這段期間可能有新上傳沿用相同檔案，刪除前仍需重新確認引用
+    db = create_async_session()
+    try:
+        for avatar_path in avatar_paths:
+            await AvatarManager.delete_unreferenced_avatar(db, avatar_path, UPLOAD_DIR.parent)
+    finally:
+        await db.close()
+
+
+@router.patch("/users/bulk/active", response_model=BulkOperationResponse)
+async def bulk_update_user_active(
+    payload: BulkActiveUpdate,
+    admin: User = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    target_ids, errors = _exclude_self(payload.user_ids, admin, "不能停用自己的帳號")
+
+    values = {"is_active": payload.is_active}
+    if not payload.is_active:
+        # 停用時遞增 token_version，已簽發的 token 立即失效
+        values["token_version"] = User.token_version + 1
+
+    rows = []
+    if target_ids:
+        rows = (await db.execute(
+            update(User)
+            .where(User.id.in_(target_ids))
+            .values(**values)
+            .returning(User.id, User.token_version, User.is_active)
+            .execution_options(synchronize_session=False)
+        )).all()
+        await db.commit()
+
+    await user_cache.invalidate_many(row.id for row in rows)
+    for row in rows:
+        token_versions.update(row.id, row.token_version, row.is_active)
+
+    return _bulk_report(payload.user_ids, {row.id for row in rows}, errors)
+
+
+@router.post("/users/bulk/delete", response_model=BulkOperationResponse)
+async def bulk_delete_users(
+    payload: BulkUserIds,
+    background_tasks: BackgroundTasks,
+    admin: User = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    target_ids, errors = _exclude_self(payload.user_ids, admin, "不能刪除自己的帳號")
+
+    deleted = {}
+    orphaned_avatars = set()
+    if target_ids:
+        rows = (await db.execute(
+            delete(User)
+            .where(User.id.in_(target_ids))
+            .returning(User.id, User.avatar)
+            .execution_options(synchronize_session=False)
+        )).all()
+        deleted = {row.id: row.avatar for row in rows}
+
+        # 相同內容的頭像會共用檔案，只刪除已經沒有其他用戶引用的
+        avatars = {avatar for avatar in deleted.values() if avatar}
+        if avatars:
+            still_referenced = set(await db.scalars(
+                select(User.avatar).where(User.avatar.in_(avatars)).distinct()
+            ))
+            orphaned_avatars = avatars - still_referenced
+
+        await db.commit()
+
+    await user_cache.invalidate_many(deleted)
+    for user_id in deleted:
+        token_versions.remove(user_id)
+
+    # 檔案刪除在回應送出後進行，不拖慢批次請求
+    if orphaned_avatars:
+        background_tasks.add_task(_delete_unreferenced_avatars, sorted(orphaned_avatars))
+
+    return _bulk_report(payload.user_ids, set(deleted), errors)
+
+
+@router.patch("/users/bulk/reset-password", response_model=BulkOperationResponse)
+async def bulk_reset_user_password(
+    payload: BulkPasswordReset,
+    admin: User = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    target_ids, errors = _exclude_self(
+        payload.user_ids, admin, "不能重置自己的密碼，請使用正常的修改密碼流程"
+    )
+
+    existing = list(await db.scalars(select(User.id).where(User.id.in_(target_ids)))) if target_ids else []
+
+    # 每個帳號各自加鹽，在 bcrypt 行程池中並行計算
+    # 同時送出的數量不超過 worker 數，保留排隊空間給一般登入請求
+    slots = asyncio.Semaphore(max(password_hasher.max_workers, 1))
+
+    async def hash_password() -> str:
+        async with slots:
+            return await get_password_hash_async(payload.new_password)
+
+    hashed_passwords = await asyncio.gather(*(hash_password() for _ in existing))
+
+    updated = []
+    if existing:
+        # Core 的批次 UPDATE（executemany），整批在同一個交易中提交；同時遞增 token_version 讓舊 token 失效
+        # 不使用 ORM 依主鍵批次更新：計算雜湊期間被刪除的用戶會讓它丟出 StaleDataError，這裡只是更新 0 列
+        users = User.__table__
+        await db.execute(
+            update(users)
+            .where(users.c.id == bindparam("target_id"))
+            .values(hashed_password=bindparam("new_hash"), token_version=users.c.token_version + 1),
+            [
+                {"target_id": user_id, "new_hash": hashed_password}
+                for user_id, hashed_password in zip(existing, hashed_passwords)
+            ]
+        )
+        # 同一交易中讀回實際更新的列，並發刪除的用戶不在其中，回報為 not_found
+        updated = (await db.execute(
+            select(User.id, User.token_version, User.is_active).where(User.id.in_(existing))
+        )).all()
+        await db.commit()
+
+    await user_cache.invalidate_many(row.id for row in updated)
+    for row in updated:
+        token_versions.update(row.id, row.token_version, row.is_active)
+
+    return _bulk_report(payload.user_ids, {row.id for row in updated}, errors)
 
 
 @router.patch("/users/{user_id}/toggle-active", response_model=UserResponse)
-def toggle_user_active(
+async def toggle_user_active(
     user_id: int,
     admin: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
 
     if not user:
         raise HTTPException(
@@ -61,20 +280,38 @@ def toggle_user_active(
             detail="不能停用自己的帳號"
         )
 
-    user.is_active = not user.is_active
-    db.commit()
-    db.refresh(user)
+    # 在 SQL 端切換並遞增，並發的管理操作不會讀到舊值後互相覆蓋；SET 右側讀取的都是更新前的值
+    # 原本為啟用（這次停用）時遞增 token_version，已簽發的 token 立即失效
+    updated = (await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(
+            is_active=not_(User.is_active),
+            token_version=case((User.is_active, User.token_version + 1), else_=User.token_version)
+        )
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    )).scalar_one_or_none()
+    if updated is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="用戶不存在"
+        )
+    await db.commit()
+    await db.refresh(user)
+    await user_cache.invalidate(user.id)
+    token_versions.update(user.id, user.token_version, user.is_active)
 
     return user
 
 
 @router.delete("/users/{user_id}")
-def delete_user(
+async def delete_user(
     user_id: int,
     admin: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
 
     if not user:
         raise HTTPException(
@@ -89,22 +326,24 @@ def delete_user(
         )
 
     if user.avatar:
-        AvatarManager.delete_avatar(user.avatar, UPLOAD_DIR)
+        await AvatarManager.delete_unreferenced_avatar(db, user.avatar, UPLOAD_DIR.parent, user.id)
 
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    await user_cache.invalidate(user.id)
+    token_versions.remove(user.id)
 
     return {"message": f"用戶 {user.username} 已被刪除"}
 
 
 @router.patch("/users/{user_id}/reset-password")
-def reset_user_password(
+async def reset_user_password(
     user_id: int,
     password_data: AdminPasswordReset,
     admin: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
 
     if not user:
         raise HTTPException(
@@ -118,66 +357,177 @@ def reset_user_password(
             detail="不能重置自己的密碼，請使用正常的修改密碼流程"
         )
 
-    user.hashed_password = get_password_hash(password_data.new_password)
-    db.commit()
+    hashed_password = await get_password_hash_async(password_data.new_password)
+    # 重置密碼後讓該用戶所有已簽發的 token 失效；與批次端點相同，在 SQL 端遞增，並發操作不會遺失遞增
+    updated = (await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(hashed_password=hashed_password, token_version=User.token_version + 1)
+        .returning(User.token_version, User.is_active)
+        .execution_options(synchronize_session=False)
+    )).one_or_none()
+    # 計算雜湊期間用戶可能已被刪除
+    if updated is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="用戶不存在"
+        )
+    await db.commit()
+    await user_cache.invalidate(user.id)
+    token_versions.update(user.id, updated.token_version, updated.is_active)
 
     return {"message": f"用戶 {user.username} 的密碼已重置"}
 
 
 @router.get("/audit-logs", response_model=AuditLogListResponse)
-def get_audit_logs(
+async def get_audit_logs(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     action: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="上一頁回傳的 next_cursor，提供時改用 keyset 分頁"),
     admin: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(
+    query = select(
         AuditLog.id,
         AuditLog.user_id,
-        User.username,
+        AuditLog.username,
         AuditLog.action,
         AuditLog.ip_address,
         AuditLog.user_agent,
         AuditLog.details,
         AuditLog.created_at
-    ).outerjoin(User, AuditLog.user_id == User.id)
+    )
 
     if action:
-        query = query.filter(AuditLog.action == action)
+        query = query.where(AuditLog.action == action)
 
-    query = query.order_by(AuditLog.created_at.desc())
+    query = query.order_by(AuditLog.created_at.desc(), AuditLog.id.desc())
 
-    offset = (page - 1) * page_size
-    results = query.offset(offset).limit(page_size + 1).all()
+    # 游標模式直接從上一頁最後一筆之後開始讀，深分頁不需要掃描並丟棄前面的資料
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.where(tuple_(AuditLog.created_at, AuditLog.id) < tuple_(cursor_created_at, cursor_id))
+        offset = 0
+    else:
+        offset = (page - 1) * page_size
+        query = query.offset(offset)
+
+    results = (await db.execute(query.limit(page_size + 1))).all()
 
     has_more = len(results) > page_size
     if has_more:
         results = results[:page_size]
 
-    total = page * page_size if has_more else offset + len(results)
-    total_pages = page + 1 if has_more else page
-
-    logs = [
-        AuditLogResponse(
-            id=row[0],
-            user_id=row[1],
-            username=row[2],
-            action=row[3],
-            ip_address=row[4],
-            user_agent=row[5],
-            details=row[6],
-            created_at=row[7]
+    if cursor:
+        # 游標模式沒有頁碼，總數也不是這一頁能精確換算的值，一律省略
+        total = total_pages = None
+    elif settings.AUDIT_ROLLUPS_ENABLED:
+        # 彙總表與 audit_logs 同一交易更新，總數是精確值；只讀取少數幾列，不必 COUNT(*) 整張表
+        total_query = select(func.coalesce(func.sum(AuditLogActionTotal.count), 0))
+        if action:
+            total_query = total_query.where(AuditLogActionTotal.action == action)
+        total = max(await db.scalar(total_query), offset + len(results))
+        total_pages = max(math.ceil(total / page_size), 1)
+    else:
+        total = page * page_size if has_more else offset + len(results)
+        total_pages = page + 1 if has_more else page
+    next_cursor = encode_cursor(results[-1].created_at, results[-1].id) if has_more else None
+
+    # 查詢欄位與 AuditLogResponse 一一對應，直接以列的 dict 編碼，不逐筆建立 pydantic 模型
+    return json_response({
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "total_pages": total_pages,
+        "next_cursor": next_cursor,
+        "logs": [row._asdict() for row in results],
+    })
+
+
+@router.get("/audit-logs/stats", response_model=AuditStatsResponse)
+async def get_audit_stats(
+    hours: int = Query(24, ge=1, le=24 * 31, description="每小時統計涵蓋最近幾小時（UTC）"),
+    action: Optional[str] = Query(None, description="只回傳此 action 的每小時統計"),
+    ip_action: str = Query("login_failed", description="IP 排行統計的 action"),
+    day: Optional[date] = Query(None, description="IP 排行的日期（UTC），預設今天"),
+    top: int = Query(20, ge=1, le=100),
+    admin: User = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if not settings.AUDIT_ROLLUPS_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="審計統計未啟用"
         )
-        for row in results
-    ]
 
-    db.expunge_all()
+    # 只讀取彙總表，查詢成本與審計日誌筆數無關
+    now = datetime.now(timezone.utc)
+    since = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours - 1)
+    day = day or now.date()
+
+    totals = (await db.execute(
+        select(AuditLogActionTotal.action, AuditLogActionTotal.count).order_by(AuditLogActionTotal.action)
+    )).all()
+
+    hourly_query = (
+        select(AuditLogHourlyRollup.bucket, AuditLogHourlyRollup.action, AuditLogHourlyRollup.count)
+        .where(AuditLogHourlyRollup.bucket >= since)
+        .order_by(AuditLogHourlyRollup.bucket, AuditLogHourlyRollup.action)
+    )
+    if action:
+        hourly_query = hourly_query.where(AuditLogHourlyRollup.action == action)
+    hourly = (await db.execute(hourly_query)).all()
+
+    top_ips = (await db.execute(
+        select(AuditLogIpDailyRollup.ip_address, AuditLogIpDailyRollup.action, AuditLogIpDailyRollup.count)
+        .where(AuditLogIpDailyRollup.day == day, AuditLogIpDailyRollup.action == ip_action)
+        .order_by(AuditLogIpDailyRollup.count.desc(), AuditLogIpDailyRollup.ip_address)
+        .limit(top)
+    )).all()
+
+    return AuditStatsResponse(
+        total=sum(row.count for row in totals),
+        totals=[AuditActionCount(action=row.action, count=row.count) for row in totals],
+        since=since,
+        hourly=[AuditHourlyCount(bucket=row.bucket, action=row.action, count=row.count) for row in hourly],
+        day=day,
+        top_ips=[
+            AuditIpCount(ip_address=row.ip_address or None, action=row.action, count=row.count)
+            for row in top_ips
+        ]
+    )
+
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+@router.get("/audit-logs/export")
+async def export_audit_logs(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    action: Optional[str] = Query(None),
+    start: Optional[datetime] = Query(None, description="起始時間（含）"),
+    end: Optional[datetime] = Query(None, description="結束時間（不含）"),
+    admin: User = Depends(get_admin_user)
+):
+    query = select(*EXPORT_COLUMNS)
+
+    if action:
+        query = query.where(AuditLog.action == action)
+    if start:
+        query = query.where(AuditLog.created_at >= start)
+    if end:
+        query = query.where(AuditLog.created_at < end)
+
+    query = query.order_by(AuditLog.created_at, AuditLog.id)
+
+    filename = f"audit_logs_{datetime.now(timezone.utc):%Y%m%d%H%M%S}.{format}"
 
-    return AuditLogListResponse(
-        total=total,
-        page=page,
-        page_size=page_size,
-        total_pages=total_pages,
-        logs=logs
+    return StreamingResponse(
+        stream_audit_logs(query, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
@@ -1,52 +1,53 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from datetime import timedelta
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 
-from ...core.database import get_db
-from ...core.security import get_password_hash, verify_password, create_access_token, get_current_user
+from ...core.database import get_async_db
+from ...core.security import get_password_hash_async, verify_password_async, create_access_token, get_current_user
 from ...core.config import settings
+from ...core.audit import audit_buffer
+from ...core.rate_limit import limiter
+from ...core.login_guard import login_guard
 from ...models.user import User
-from ...models.audit_log import AuditLog
 from ...schemas.user import UserCreate, UserLogin, UserResponse
 
 router = APIRouter()
-limiter = Limiter(key_func=get_remote_address)
 
 
 def create_audit_log(
-    db: Session,
     user_id: int | None,
     action: str,
     request: Request,
-    details: str | None = None
+    details: str | None = None,
+    username: str | None = None
 ):
-    audit_log = AuditLog(
+    audit_buffer.record(
         user_id=user_id,
+        username=username,
         action=action,
         ip_address=request.client.host if request.client else None,
         user_agent=request.headers.get("user-agent"),
         details=details
     )
-    db.add(audit_log)
-    db.commit()
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 @limiter.limit("5/minute")
-def register(request: Request, user: UserCreate, db: Session = Depends(get_db)):
-    existing_username = db.query(User).filter(User.username == user.username).first()
-    existing_email = db.query(User).filter(User.email == user.email).first()
+async def register(request: Request, user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    # 單一查詢同時檢查用戶名與郵箱，只取主鍵不載入整列
+    existing_user = await db.scalar(
+        select(User.id).where(or_(User.username == user.username, User.email == user.email)).limit(1)
+    )
 
-    if existing_username or existing_email:
+    if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="用戶名或郵箱已被使用"
         )
 
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     new_user = User(
         username=user.username,
         email=user.email,
@@ -54,41 +55,52 @@ def register(request: Request, user: UserCreate, db: Session = Depends(get_db)):
     )
     db.add(new_user)
 
+    # id 與 created_at 等伺服器預設值在 INSERT ... RETURNING 時一併取回，不需要再 refresh
     try:
-        db.commit()
-        db.refresh(new_user)
-
-        create_audit_log(
-            db=db,
-            user_id=new_user.id,
-            action="register",
-            request=request,
-            details=f"用戶 {new_user.username} 註冊成功"
-        )
-
+        await db.commit()
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="用戶名或郵箱已被使用"
         )
 
+    create_audit_log(
+        user_id=new_user.id,
+        username=new_user.username,
+        action="register",
+        request=request,
+        details=f"用戶 {new_user.username} 註冊成功"
+    )
+
     return new_user
 
 
 @router.post("/login", response_model=UserResponse)
 @limiter.limit("5/minute")
-def login(request: Request, credentials: UserLogin, response: Response, db: Session = Depends(get_db)):
+async def login(request: Request, credentials: UserLogin, response: Response, db: AsyncSession = Depends(get_async_db)):
     """
     用戶登入路由
     """
+    ip_address = request.client.host if request.client else None
+
+    # 失敗次數過多的郵箱或 IP 在查詢資料庫與計算 bcrypt 之前就拒絕，審計日誌由 login_guard 定期彙總
+    retry_after = await login_guard.check(credentials.email, ip_address)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="登入失敗次數過多，請稍後再試",
+            headers={"Retry-After": str(retry_after)},
+        )
+
     # 根據 Email 查找用戶
-    user = db.query(User).filter(User.email == credentials.email).first()
+    user = await db.scalar(select(User).where(User.email == credentials.email))
 
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    if not user or not await verify_password_async(credentials.password, user.hashed_password):
+        await login_guard.record_failure(credentials.email, ip_address)
         create_audit_log(
-            db=db,
             user_id=user.id if user else None,
+            username=user.username if user else None,
             action="login_failed",
             request=request,
             details=f"郵箱：{credentials.email}"
@@ -106,9 +118,11 @@ def login(request: Request, credentials: UserLogin, response: Response, db: Sess
             detail="帳號已被停用，請聯繫管理員"
         )
 
+    await login_guard.record_success(credentials.email)
+
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(user.id), "role": user.role},
+        data={"sub": str(user.id), "role": user.role, "ver": user.token_version},
         expires_delta=access_token_expires
     )
 
@@ -123,8 +137,8 @@ def login(request: Request, credentials: UserLogin, response: Response, db: Sess
     )
 
     create_audit_log(
-        db=db,
         user_id=user.id,
+        username=user.username,
         action="login_success",
         request=request,
         details=f"用戶 {user.username} 登入成功"
@@ -134,15 +148,14 @@ def login(request: Request, credentials: UserLogin, response: Response, db: Sess
 
 
 @router.post("/logout")
-def logout(
+async def logout(
     response: Response,
     request: Request,
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     create_audit_log(
-        db=db,
         user_id=current_user.id,
+        username=current_user.username,
         action="logout",
         request=request,
         details=f"用戶 {current_user.username} 登出"
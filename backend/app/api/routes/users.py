@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
-from sqlalchemy.orm import Session
-import uuid
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from pathlib import Path
-from ...core.security import get_current_user, get_password_hash, verify_password
-from ...core.database import get_db
+from ...core.security import get_current_user, get_password_hash_async, verify_password_async
+from ...core.database import get_async_db
+from ...core.user_cache import user_cache
 from ...core.config import settings
-from ...core.file_utils import AvatarManager
+from ...core.etag import make_etag, etag_matches, etag_headers, not_modified
+from ...core.file_utils import AvatarManager, UploadTooLargeError, InvalidImageError
 from ...models.user import User
 from ...schemas.user import UserResponse, UserUpdate
 
@@ -16,18 +19,31 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
+    # 回應內容只來自 users 的單一列，任何修改都會更新 updated_at；ETag 含 id，避免同一瀏覽器換帳號後誤用舊資料
+    etag = make_etag("me", current_user.id, current_user.updated_at or current_user.created_at)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    response.headers.update(etag_headers(etag))
     return current_user
 
 
 @router.patch("/me", response_model=UserResponse)
-def update_current_user(
+async def update_current_user(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
+    # 快取命中時 current_user 為 detached 物件，需先加入 Session 才能追蹤修改
+    db.add(current_user)
+
     if user_update.username and user_update.username != current_user.username:
-        existing_user = db.query(User).filter(User.username == user_update.username).first()
+        existing_user = await db.scalar(select(User).where(User.username == user_update.username))
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -36,7 +52,7 @@ def update_current_user(
         current_user.username = user_update.username
 
     if user_update.email and user_update.email != current_user.email:
-        existing_user = db.query(User).filter(User.email == user_update.email).first()
+        existing_user = await db.scalar(select(User).where(User.email == user_update.email))
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -53,15 +69,16 @@ def update_current_user(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="修改密碼需要提供舊密碼"
             )
-        if not verify_password(user_update.old_password, current_user.hashed_password):
+        if not await verify_password_async(user_update.old_password, current_user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="舊密碼錯誤"
             )
-        current_user.hashed_password = get_password_hash(user_update.password)
+        current_user.hashed_password = await get_password_hash_async(user_update.password)
 
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
+    await user_cache.invalidate(current_user.id)
     return current_user
 
 
@@ -69,7 +86,7 @@ def update_current_user(
 async def upload_avatar(
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     file_ext = Path(file.filename).suffix.lower()
     if file_ext not in settings.ALLOWED_EXTENSIONS:
@@ -78,30 +95,53 @@ async def upload_avatar(
             detail=f"不支援的檔案格式，允許: {', '.join(settings.ALLOWED_EXTENSIONS)}"
         )
 
-    contents = await file.read()
-    if len(contents) > settings.MAX_FILE_SIZE:
+    try:
+        filename, spare_path = await AvatarManager.save_upload(file, UPLOAD_DIR, file_ext, settings.MAX_FILE_SIZE)
+    except UploadTooLargeError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="檔案大小超過 5MB"
         )
-
-    if not AvatarManager.validate_image(contents):
+    except InvalidImageError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="無效的圖片檔案"
         )
 
-    if current_user.avatar:
-        AvatarManager.delete_avatar(current_user.avatar, UPLOAD_DIR.parent)
+    avatar_path = f"uploads/avatars/{filename}"
 
-    filename = f"{uuid.uuid4()}{file_ext}"
-    file_path = UPLOAD_DIR / filename
-
-    with open(file_path, "wb") as f:
-        f.write(contents)
+    try:
+        # 在行程池中產生縮圖；Pillow 無法解析代表檔頭正確但內容無效
+        try:
+            await AvatarManager.create_derivatives(UPLOAD_DIR, filename)
+        except InvalidImageError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="無效的圖片檔案"
+            )
 
-    current_user.avatar = f"uploads/avatars/{filename}"
-    db.commit()
-    db.refresh(current_user)
+        # 新檔案寫入成功後才刪除舊頭像（其他用戶仍引用相同內容時保留）
+        if current_user.avatar and current_user.avatar != avatar_path:
+            await AvatarManager.delete_unreferenced_avatar(db, current_user.avatar, UPLOAD_DIR.parent, current_user.id)
+
+        db.add(current_user)
+        current_user.avatar = avatar_path
+        await db.commit()
+
+        # 沿用的既有檔案可能在提交前被其他請求刪除，還原後補上縮圖
+        if await AvatarManager.restore_shared_upload(UPLOAD_DIR, filename, spare_path):
+            await AvatarManager.create_derivatives(UPLOAD_DIR, filename)
+    except BaseException:
+        # 本次新建立的原圖在提交前沒有任何用戶引用，任何失敗（無效圖片、行程池損壞、I/O 錯誤）都刪除，
+        # 避免留下孤兒檔案；同時沿用此檔案的其他請求持有自己的暫存檔，提交後會自行還原
+        if spare_path is None:
+            await run_in_threadpool(AvatarManager.delete_avatar, avatar_path, UPLOAD_DIR.parent)
+        raise
+    finally:
+        if spare_path is not None:
+            await run_in_threadpool(spare_path.unlink, missing_ok=True)
+
+    await db.refresh(current_user)
+    await user_cache.invalidate(current_user.id)
 
     return current_user
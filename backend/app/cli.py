@@ -0,0 +1,83 @@
+"""
+後端管理指令
+執行: python -m app.cli <指令> [參數]
+"""
+import argparse
+
+from .core.config import settings
+
+
+def init_db(args: argparse.Namespace) -> None:
+    from .core.database import init_engines
+    from .core.schema import bootstrap_schema, backfill_audit_usernames, normalize_sqlite_timestamps
+
+    engine = init_engines()
+    changes = bootstrap_schema(engine)
+
+    normalized = normalize_sqlite_timestamps(engine)
+    if normalized:
+        changes.append(f"將 {normalized} 筆 SQLite 時間補齊到微秒格式")
+
+    backfilled = backfill_audit_usernames(engine)
+    if backfilled:
+        changes.append(f"補上 {backfilled} 筆審計日誌的用戶名")
+
+    if not changes:
+        print("資料庫結構已是最新")
+        return
+
+    for change in changes:
+        print(f"  - {change}")
+
+
+def archive_audit_logs(args: argparse.Namespace) -> None:
+    from .core.retention import archive_audit_logs as run_archive
+
+    stats = run_archive(
+        older_than_days=args.older_than_days,
+        batch_size=args.batch_size,
+        max_batches=args.max_batches
+    )
+
+    if stats["skipped"]:
+        print("另一個封存程序正在執行，已略過")
+        return
+
+    print(f"已封存 {stats['archived']} 筆審計日誌（{stats['batches']} 批）")
+    for bucket in stats["buckets"]:
+        print(f"  - {bucket}")
+
+
+def rebuild_audit_rollups(args: argparse.Namespace) -> None:
+    from .core.audit_rollups import rebuild_rollups
+
+    stats = rebuild_rollups(batch_size=args.batch_size)
+    print(
+        f"已從 {stats['events']} 筆審計日誌重建彙總："
+        f"{stats['hourly']} 個小時區間、{stats['ip_daily']} 筆 IP 每日統計、{stats['actions']} 種 action"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=f"{settings.PROJECT_NAME} 管理指令")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    init_parser = subparsers.add_parser("init-db", help="建立資料表並補上新增的欄位與索引")
+    init_parser.set_defaults(handler=init_db)
+
+    archive_parser = subparsers.add_parser("archive-audit-logs", help="封存並刪除過期的審計日誌")
+    archive_parser.add_argument("--older-than-days", type=int, default=settings.AUDIT_RETENTION_DAYS or 180)
+    archive_parser.add_argument("--batch-size", type=int, default=settings.AUDIT_RETENTION_BATCH_SIZE)
+    archive_parser.add_argument("--max-batches", type=int, default=None, help="最多執行幾批（預設直到處理完）")
+    archive_parser.set_defaults(handler=archive_audit_logs)
+
+    rollup_parser = subparsers.add_parser("rebuild-audit-rollups", help="從審計日誌重建統計彙總表")
+    rollup_parser.add_argument("--batch-size", type=int, default=5000)
+    rollup_parser.set_defaults(handler=rebuild_audit_rollups)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
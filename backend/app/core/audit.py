@@ -0,0 +1,164 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import insert
+from .config import settings
+from .database import create_async_session
+from .metrics import register_collector
+from .audit_rollups import RollupCounts, rollup_statements
+from ..models.audit_log import AuditLog
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLogBuffer:
+    """
+    審計日誌寫入緩衝（write-behind）
+    路由只負責把事件放進有界佇列，背景任務每累積 batch_size 筆或每 flush_interval 秒
+    以單一多列 INSERT 寫入資料庫；啟用彙總時在同一個交易中累加彙總表，兩者永遠一致
+
+    佇列滿時採用「丟棄最新事件」策略並累計 dropped，確保登入等熱路徑永遠不會被審計寫入阻塞
+    """
+
+    def __init__(self, max_queue_size: int, batch_size: int, flush_interval_ms: int, rollups_enabled: bool = False):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.rollups_enabled = rollups_enabled
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    def _get_queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        return self._queue
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def record(self, **values) -> None:
+        # 以入列時間作為事件時間，不受批次寫入延遲影響
+        values.setdefault("created_at", datetime.now(timezone.utc))
+
+        try:
+            self._get_queue().put_nowait(values)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止背景任務，並把佇列中剩餘的事件全部寫入"""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+        queue = self._get_queue()
+        while not queue.empty():
+            batch = [queue.get_nowait() for _ in range(min(self.batch_size, queue.qsize()))]
+            await self._flush(batch)
+
+        # 佇列綁定目前的事件迴圈，下次 start 時重新建立
+        self._queue = None
+
+    async def _run(self) -> None:
+        # 任何例外都只記錄後繼續；背景任務一旦結束，佇列會被填滿，之後的事件全部被丟棄
+        while not self._stopping.is_set():
+            try:
+                batch = await self._collect()
+                if batch:
+                    await self._flush(batch)
+            except Exception:
+                logger.exception("審計日誌寫入任務發生錯誤，繼續處理後續事件")
+
+    async def _collect(self) -> list:
+        queue = self._get_queue()
+        loop = asyncio.get_running_loop()
+
+        try:
+            batch = [await asyncio.wait_for(queue.get(), timeout=self.flush_interval)]
+        except asyncio.TimeoutError:
+            return []
+
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            remaining = deadline - loop.time()
+            if remaining <= 0 or self._stopping.is_set():
+                break
+
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _flush(self, batch: list) -> None:
+        db = create_async_session()
+        try:
+            await db.execute(insert(AuditLog).values(batch))
+            if self.rollups_enabled:
+                counts = RollupCounts()
+                counts.add_events(batch)
+                for statement, params in rollup_statements(counts):
+                    await db.execute(statement, params)
+            await db.commit()
+            self.flushed += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("審計日誌批次寫入失敗，共 %d 筆", len(batch))
+            # 資料庫無法連線時 rollback / close 也可能失敗，不能讓例外中斷寫入任務
+            try:
+                await db.rollback()
+            except Exception:
+                logger.warning("審計日誌交易回滾失敗", exc_info=True)
+        finally:
+            try:
+                await db.close()
+            except Exception:
+                logger.warning("審計日誌 Session 關閉失敗", exc_info=True)
+
+    def collect(self):
+        return [
+            ("audit_log_pending", "gauge", "等待寫入的審計日誌數", [({}, self.pending)]),
+            ("audit_log_events_total", "counter", "審計日誌事件數（依處理結果）", [
+                ({"result": "flushed"}, self.flushed),
+                ({"result": "dropped"}, self.dropped),
+                ({"result": "failed"}, self.failed),
+            ]),
+        ]
+
+    def snapshot(self) -> dict:
+        return {
+            "pending": self.pending,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+audit_buffer = AuditLogBuffer(
+    max_queue_size=settings.AUDIT_LOG_QUEUE_SIZE,
+    batch_size=settings.AUDIT_LOG_BATCH_SIZE,
+    flush_interval_ms=settings.AUDIT_LOG_FLUSH_INTERVAL_MS,
+    rollups_enabled=settings.AUDIT_ROLLUPS_ENABLED
+)
+register_collector(audit_buffer.collect)
@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Sequence
+from sqlalchemy import Select
+from .database import create_async_session
+from ..models.audit_log import AuditLog
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = (
+    AuditLog.id,
+    AuditLog.user_id,
+    AuditLog.username,
+    AuditLog.action,
+    AuditLog.ip_address,
+    AuditLog.user_agent,
+    AuditLog.details,
+    AuditLog.created_at,
+)
+
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+# 試算表會把以這些字元開頭的儲存格當成公式（例如 =HYPERLINK(...)）
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _row_values(row) -> list:
+    return [value.isoformat() if hasattr(value, "isoformat") else value for value in row]
+
+
+def _csv_cell(value):
+    """user_agent、details、username 由使用者控制，開頭為公式字元時加上 ' 讓 Excel 視為純文字"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def rows_to_ndjson(rows: Sequence) -> bytes:
+    lines = (
+        json.dumps(dict(zip(EXPORT_FIELDS, _row_values(row))), ensure_ascii=False)
+        for row in rows
+    )
+    return ("\n".join(lines) + "\n").encode()
+
+
+def rows_to_csv(rows: Sequence, include_header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if include_header:
+        # 加上 BOM，讓 Excel 正確辨識 UTF-8 中文
+        buffer.write("\ufeff")
+        writer.writerow(EXPORT_FIELDS)
+    writer.writerows([_csv_cell(value) for value in _row_values(row)] for row in rows)
+    return buffer.getvalue().encode()
+
+
+async def stream_audit_logs(query: Select, fmt: str) -> AsyncIterator[bytes]:
+    """
+    以伺服器端游標逐批讀取審計日誌並轉成 NDJSON / CSV 區塊
+    記憶體用量只與 EXPORT_BATCH_SIZE 有關，與匯出總筆數無關
+    使用獨立的 Session，生命週期跟隨串流回應而非請求的依賴注入
+    """
+    db = create_async_session()
+    try:
+        if fmt == "csv":
+            yield rows_to_csv([], include_header=True)
+
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for partition in result.partitions(EXPORT_BATCH_SIZE):
+            yield rows_to_csv(partition) if fmt == "csv" else rows_to_ndjson(partition)
+    finally:
+        await db.close()
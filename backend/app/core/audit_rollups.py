@@ -0,0 +1,115 @@
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache
+from sqlalchemy import select, delete, text
+from .database import create_session, upsert_insert
+from ..models.audit_log import AuditLog
+from ..models.audit_rollup import AuditLogHourlyRollup, AuditLogIpDailyRollup, AuditLogActionTotal
+
+ROLLUP_MODELS = (AuditLogHourlyRollup, AuditLogIpDailyRollup, AuditLogActionTotal)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite 讀回的時間沒有時區，寫入時一律為 UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+class RollupCounts:
+    """在記憶體中累計一批事件對各彙總表的增量；count 為負數代表扣除（封存刪除時使用）"""
+
+    def __init__(self):
+        self.hourly: Counter = Counter()
+        self.ip_daily: Counter = Counter()
+        self.totals: Counter = Counter()
+
+    def add(self, action: str, ip_address, created_at: datetime, count: int = 1) -> None:
+        created_at = _as_utc(created_at)
+        self.hourly[(action, created_at.replace(minute=0, second=0, microsecond=0))] += count
+        self.ip_daily[(ip_address or "", action, created_at.date())] += count
+        self.totals[action] += count
+
+    def add_rows(self, rows, count: int = 1) -> None:
+        for row in rows:
+            self.add(row.action, row.ip_address, row.created_at, count)
+
+    def add_events(self, events: list) -> None:
+        for event in events:
+            self.add(event["action"], event.get("ip_address"), event["created_at"])
+
+
+@lru_cache(maxsize=None)
+def _upsert_statement(model):
+    """count = count + excluded.count；並發的批次寫入在資料庫端累加，不需要先讀再寫"""
+    table = model.__table__
+    statement = upsert_insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key.columns],
+        set_={"count": table.c.count + statement.excluded.count}
+    )
+
+
+def rollup_statements(counts: RollupCounts) -> list[tuple]:
+    """
+    回傳 (statement, params) 列表，由呼叫端在寫入 / 刪除審計日誌的同一個交易中執行
+    參數依主鍵排序，多個 worker 同時更新相同的列時以相同順序取得列鎖，避免死鎖
+    """
+    statements = []
+    groups = (
+        (AuditLogHourlyRollup, counts.hourly, ("action", "bucket")),
+        (AuditLogIpDailyRollup, counts.ip_daily, ("ip_address", "action", "day")),
+        (AuditLogActionTotal, {(action,): count for action, count in counts.totals.items()}, ("action",)),
+    )
+
+    for model, counter, keys in groups:
+        params = [
+            {**dict(zip(keys, key)), "count": count}
+            for key, count in sorted(counter.items()) if count
+        ]
+        if not params:
+            continue
+        statements.append((_upsert_statement(model), params))
+        if any(param["count"] < 0 for param in params):
+            statements.append((delete(model).where(model.count <= 0), None))
+
+    return statements
+
+
+def rebuild_rollups(batch_size: int = 5000) -> dict:
+    """
+    清空彙總表並從 audit_logs 重新計算，用於首次啟用或修正不一致
+
+    PostgreSQL 會先鎖住彙總表：同時進行的批次寫入在 upsert 時等待，
+    它們尚未提交的 audit_logs 列不會被這次重建讀到，解鎖後再各自累加，因此不會重複或遺漏
+    """
+    counts = RollupCounts()
+    events = 0
+
+    with create_session() as db:
+        if db.get_bind().dialect.name == "postgresql":
+            tables = ", ".join(model.__tablename__ for model in ROLLUP_MODELS)
+            db.execute(text(f"LOCK TABLE {tables} IN SHARE ROW EXCLUSIVE MODE"))
+
+        for model in ROLLUP_MODELS:
+            db.execute(delete(model))
+
+        result = db.execute(
+            select(AuditLog.action, AuditLog.ip_address, AuditLog.created_at)
+            .where(AuditLog.created_at.is_not(None))
+            .execution_options(yield_per=batch_size)
+        )
+        for partition in result.partitions():
+            counts.add_rows(partition)
+            events += len(partition)
+
+        for statement, params in rollup_statements(counts):
+            db.execute(statement, params)
+        db.commit()
+
+    return {
+        "events": events,
+        "hourly": len(counts.hourly),
+        "ip_daily": len(counts.ip_daily),
+        "actions": len(counts.totals),
+    }
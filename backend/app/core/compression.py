@@ -0,0 +1,210 @@
+import zlib
+from functools import lru_cache
+from typing import Callable, Optional
+
+try:
+    import zstandard
+except ImportError:  # 未安裝 zstandard 時不提供 zstd 編碼
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # 未安裝 brotli 時不提供 br 編碼
+    brotli = None
+
+# 伺服器端偏好順序：zstd 壓縮速度最快，br 壓縮率最好，gzip 所有用戶端都支援
+ENCODING_PREFERENCE = ("zstd", "br", "gzip")
+
+# 只壓縮文字類內容；圖片與壓縮檔本身已經壓縮過，再壓一次只浪費 CPU
+COMPRESSIBLE_PREFIXES = ("text/", "application/json", "application/x-ndjson", "application/javascript", "application/xml")
+
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        # Z_SYNC_FLUSH 讓每個串流區塊都能立刻送出，用戶端不必等整個回應結束
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+@lru_cache(maxsize=256)
+def negotiate_encoding(accept_encoding: str, available: tuple) -> Optional[str]:
+    """依 Accept-Encoding 的 q 值（0 表示拒絕）選出編碼；同一瀏覽器的標頭值固定，結果可快取"""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+
+    # q 值高者優先，相同時依 available 的順序（伺服器偏好）
+    wildcard = accepted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = accepted.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _add_vary(headers: list) -> None:
+    for index, (name, value) in enumerate(headers):
+        if name.lower() == b"vary":
+            if b"accept-encoding" not in value.lower() and value.strip() != b"*":
+                headers[index] = (name, value + b", Accept-Encoding")
+            return
+    headers.append((b"vary", b"Accept-Encoding"))
+
+
+class CompressionMiddleware:
+    """
+    純 ASGI 回應壓縮（gzip，另外安裝 brotli / zstandard 後自動支援 br / zstd）
+    - 一次送完且小於 minimum_size 的回應原樣送出
+    - 串流回應（more_body）逐區塊壓縮並立即送出，不緩衝整個 body，也不會延後第一個位元組
+    - exclude_paths 底下（例如 /api/uploads 的圖片）、HEAD 請求與已設定 Content-Encoding 的回應不處理
+    - 壓縮後內容改變，強 ETag 會改為弱 ETag（W/）
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        zstd_level: int = 3,
+        exclude_paths: tuple = ()
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.exclude_paths = tuple(exclude_paths)
+
+        factories: dict[str, Callable] = {"gzip": lambda: GzipCompressor(gzip_level)}
+        if brotli is not None:
+            factories["br"] = lambda: BrotliCompressor(brotli_quality)
+        if zstandard is not None:
+            factories["zstd"] = lambda: ZstdCompressor(zstd_level)
+        self.factories = factories
+        self.available = tuple(encoding for encoding in ENCODING_PREFERENCE if encoding in factories)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD" or scope["path"].startswith(self.exclude_paths):
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = next((value for name, value in scope["headers"] if name == b"accept-encoding"), None)
+        encoding = negotiate_encoding(accept_encoding.decode("latin-1"), self.available) if accept_encoding else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                if self._should_compress(message):
+                    # 等到第一個 body 區塊才知道大小與是否為串流，先暫存起始訊息
+                    start_message = message
+                else:
+                    passthrough = True
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = self.factories[encoding]()
+                headers = [
+                    (name, value) for name, value in start_message.get("headers", [])
+                    if name.lower() != b"content-length"
+                ]
+                headers.append((b"content-encoding", encoding.encode()))
+                _add_vary(headers)
+                headers = [
+                    (name, b"W/" + value) if name.lower() == b"etag" and not value.startswith(b"W/") else (name, value)
+                    for name, value in headers
+                ]
+
+                if not more_body:
+                    body = compressor.finish(body)
+                    headers.append((b"content-length", str(len(body)).encode()))
+                    start_message["headers"] = headers
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+                start_message["headers"] = headers
+                await send(start_message)
+
+            body = compressor.compress(body) if more_body else compressor.finish(body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _should_compress(self, message) -> bool:
+        if message["status"] < 200 or message["status"] in (204, 304):
+            return False
+
+        content_type = b""
+        for name, value in message.get("headers", []):
+            name = name.lower()
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value.lower()
+            elif name == b"cache-control" and b"no-transform" in value.lower():
+                return False
+            elif name == b"content-length" and int(value) < self.minimum_size:
+                return False
+
+        media_type = content_type.split(b";", 1)[0].decode("latin-1").strip()
+        return media_type.startswith(COMPRESSIBLE_PREFIXES) or media_type.endswith("+json")
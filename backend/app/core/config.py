@@ -1,19 +1,98 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # 路由使用非同步引擎（asyncpg）；設為 false 則改用同步 Session + 執行緒池，便於對照壓測
+    DATABASE_ASYNC: bool = True
+    ASYNC_DATABASE_URL: Optional[str] = None
+    # 每個 worker 的連線池；設定 DB_MAX_CONNECTIONS 時改為依 WEB_CONCURRENCY 平均分配，總數不超過此上限
+    # 非同步模式下同步引擎（封存、CLI）固定一條連線，DB_POOL_SIZE / DB_MAX_OVERFLOW 只套用在非同步引擎
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_MAX_CONNECTIONS: int = 0
+    WEB_CONCURRENCY: int = 1
+
+    # 啟動設定（run.py），SERVER_WORKERS 為 0 表示使用 CPU 核心數
+    SERVER_MODE: str = "development"
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0
+    SERVER_BACKLOG: int = 2048
+    SERVER_KEEPALIVE: int = 5
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    SERVER_ACCESS_LOG: bool = False
     SECRET_KEY: str
     COOKIE_SECURE: bool = False
     BACKEND_CORS_ORIGINS: list = ["http://localhost:5173"]
+    # 瀏覽器快取 CORS 預檢結果的秒數（Chromium 上限為 7200，Firefox 為 86400）
+    CORS_MAX_AGE: int = 86400
 
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # 回應壓縮：小於 COMPRESSION_MIN_SIZE 位元組的回應不壓縮；等級越高越省頻寬也越耗 CPU
+    # gzip 為 1-9，另外安裝 brotli / zstandard 時分別使用 0-11 / 1-22
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    # Prometheus 格式的 /metrics，預設關閉；只回應來源位址在 METRICS_ALLOWED_NETWORKS 內的請求，其他一律 404
+    # 數值為各 worker 各自累計：WEB_CONCURRENCY > 1 時每次抓取只取得接受該連線的那一個 worker
+    METRICS_ENABLED: bool = False
+    METRICS_ALLOWED_NETWORKS: list = ["127.0.0.1/32", "::1/128"]
+    # 每個請求的 SQL 次數與耗時：Server-Timing header、慢查詢日誌（0 表示關閉）與重複查詢（疑似 N+1）警告
+    SQL_TIMING_ENABLED: bool = True
+    SQL_SLOW_QUERY_MS: int = 200
+    SQL_REPEATED_QUERY_THRESHOLD: int = 10
+    # 無狀態驗證：以記憶體中的 token 版本表檢查停用與撤銷，不必每個請求查詢資料庫
+    AUTH_STATELESS: bool = False
+    AUTH_VERSION_REFRESH_SECONDS: float = 5
+    AUTH_VERSION_FULL_RELOAD_SECONDS: float = 300
+    # 限流計數器儲存：memory://（單一行程）、sqlite:///ratelimit.db（本機多 worker 共用）或 redis://host:6379（需安裝 redis）
+    RATE_LIMIT_STORAGE_URI: str = "memory://"
+    # 登入失敗追蹤：滑動視窗內同一郵箱 / IP 失敗達上限後直接回應 429，不查資料庫也不計算 bcrypt（上限為 0 則不追蹤該類）
+    # 被拒絕的嘗試每 LOGIN_GUARD_SUMMARY_SECONDS 秒彙總為一筆審計日誌；SHARED 時計數存放在 RATE_LIMIT_STORAGE_URI，多個 worker 共用
+    LOGIN_GUARD_ENABLED: bool = True
+    LOGIN_GUARD_WINDOW_SECONDS: int = 900
+    LOGIN_GUARD_MAX_FAILURES_PER_EMAIL: int = 10
+    LOGIN_GUARD_MAX_FAILURES_PER_IP: int = 50
+    LOGIN_GUARD_MAX_KEYS: int = 100000
+    LOGIN_GUARD_SHARED: bool = False
+    LOGIN_GUARD_SUMMARY_SECONDS: float = 60
+    # bcrypt 行程池大小（0 表示改用執行緒池）與最大排隊數，超過則回應 503
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_DEPTH: int = 64
+    # 已登入用戶快取（秒數為 0 則停用）；多個 worker 時透過 RATE_LIMIT_STORAGE_URI 廣播失效，
+    # 若仍為 memory:// 則無法廣播，WEB_CONCURRENCY > 1 時自動停用快取
+    USER_CACHE_TTL_SECONDS: int = 30
+    USER_CACHE_MAX_SIZE: int = 10000
+    # 審計日誌批次寫入：佇列上限（滿了丟棄新事件）、每批筆數、最長等待毫秒數
+    AUDIT_LOG_QUEUE_SIZE: int = 10000
+    AUDIT_LOG_BATCH_SIZE: int = 200
+    AUDIT_LOG_FLUSH_INTERVAL_MS: int = 500
+    # 審計統計彙總表（每小時 / 每 IP 每天 / 每個 action 總數），與審計日誌同一交易更新
+    # 首次啟用或關閉一段時間後重新啟用，需執行 python -m app.cli rebuild-audit-rollups
+    AUDIT_ROLLUPS_ENABLED: bool = True
+    # 審計日誌保留：超過天數的資料依月份封存為 gzip NDJSON 後刪除（天數或間隔為 0 則不啟用背景任務）
+    AUDIT_RETENTION_DAYS: int = 0
+    AUDIT_RETENTION_BATCH_SIZE: int = 5000
+    AUDIT_RETENTION_INTERVAL_HOURS: float = 0
+    AUDIT_ARCHIVE_DIR: str = "archives/audit_logs"
     PROJECT_NAME: str = "會員系統 API"
     API_V1_PREFIX: str = "/api"
     MAX_FILE_SIZE: int = 5 * 1024 * 1024
     ALLOWED_EXTENSIONS: list = [".jpg", ".jpeg", ".png", ".gif", ".webp"]
     UPLOAD_DIR: str = "uploads"
+    # 頭像縮圖尺寸（WebP，需安裝 Pillow）與處理用的行程數
+    AVATAR_THUMBNAIL_SIZES: list = [64, 128, 256]
+    AVATAR_WORKERS: int = 1
+    # 頭像允許的最大像素數，超過即拒絕而不解碼（Pillow 預設約 8900 萬，對頭像過大）
+    AVATAR_MAX_PIXELS: int = 40_000_000
+    # 上傳檔案的記憶體 LRU 快取總上限與單檔上限（0 則停用）
+    UPLOAD_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    UPLOAD_CACHE_MAX_FILE_SIZE: int = 256 * 1024
 
     class Config:
         env_file = ".env"
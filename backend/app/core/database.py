@@ -1,33 +1,308 @@
+import logging
+import time
+from typing import Optional
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from starlette.concurrency import run_in_threadpool
 from .config import settings
+from .metrics import db_pool_checkout_seconds, register_collector
+from .query_stats import instrument_engine
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_size=5,
-    max_overflow=10,
-    pool_pre_ping=True,
-    pool_recycle=3600,
-    pool_timeout=30,
-    echo=False,
-    pool_reset_on_return='rollback'
-)
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+# 非同步模式下同步引擎只供封存任務與 CLI 使用，固定一條連線且不溢出
+SECONDARY_POOL_SIZE = 1
+
+
+# 本專案支援的兩種資料庫都有 INSERT ... ON CONFLICT DO UPDATE
+UPSERT_DIALECTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def upsert_insert(table):
+    """依 DATABASE_URL 的資料庫回傳支援 on_conflict_do_update 的 insert()"""
+    return UPSERT_DIALECTS[make_url(settings.DATABASE_URL).get_backend_name()](table)
+
+
+def get_pool_limits(secondary: bool = False) -> tuple[int, int]:
+    """
+    回傳每個 worker 的 (pool_size, max_overflow)
+    設定 DB_MAX_CONNECTIONS 時依 worker 數平分，確保所有 worker 加總不超過 Postgres 連線上限
+    DATABASE_ASYNC 時每個 worker 有兩個引擎，次要的同步引擎佔用的連線先從預算中扣除
+    """
+    if secondary:
+        return SECONDARY_POOL_SIZE, 0
+
+    if settings.DB_MAX_CONNECTIONS <= 0:
+        return settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW
+
+    budget = max(settings.DB_MAX_CONNECTIONS // max(settings.WEB_CONCURRENCY, 1), 1)
+    if settings.DATABASE_ASYNC:
+        budget = max(budget - SECONDARY_POOL_SIZE, 1)
+    pool_size = max(budget * 2 // 3, 1)
+    return pool_size, budget - pool_size
+
+
+class TimedQueuePool(QueuePool):
+    """記錄取得連線的等待時間；engine.dispose() 重建連線池時會沿用同一個類別"""
+    METRICS_LABEL = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_seconds.labels(self.METRICS_LABEL).observe(time.perf_counter() - start)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    METRICS_LABEL = "async"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_seconds.labels(self.METRICS_LABEL).observe(time.perf_counter() - start)
+
+
+def _engine_options(url: str, is_async: bool = False, secondary: bool = False) -> dict:
+    options = {
+        "pool_pre_ping": True,
+        "pool_recycle": 3600,
+        "echo": False,
+        "pool_reset_on_return": "rollback",
+    }
+
+    # SQLite（本地開發 / 壓測）的非同步驅動使用 NullPool，不接受連線池大小參數
+    if make_url(url).get_backend_name() != "sqlite":
+        pool_size, max_overflow = get_pool_limits(secondary)
+        options.update(
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=30,
+            poolclass=TimedAsyncQueuePool if is_async else TimedQueuePool
+        )
+
+    return options
+
+
+def get_async_database_url() -> str:
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+
+    url = make_url(settings.DATABASE_URL)
+    drivername = ASYNC_DRIVERS.get(url.drivername, url.drivername)
+    return url.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+# 引擎延遲到 init_engines() 才建立：匯入 app 不會連線資料庫，資料庫無法連線時也能匯入
+engine = None
+async_engine = None
 
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
-    bind=engine,
     expire_on_commit=False
 )
 
+# 非同步模式才使用 AsyncSessionLocal，避免同步模式下仍需安裝 asyncpg
+AsyncSessionLocal: Optional[async_sessionmaker] = None
+
+if settings.DATABASE_ASYNC:
+    AsyncSessionLocal = async_sessionmaker(
+        autoflush=False,
+        expire_on_commit=False,
+        class_=AsyncSession
+    )
+
 Base = declarative_base()
 
 
+def init_engines():
+    """建立資料庫引擎並綁定 Session 工廠，可重複呼叫"""
+    global engine, async_engine
+
+    if engine is None:
+        # 非同步模式下路由不使用同步引擎，只給它一條連線
+        secondary = AsyncSessionLocal is not None
+        engine = create_engine(settings.DATABASE_URL, **_engine_options(settings.DATABASE_URL, secondary=secondary))
+        instrument_engine(engine)
+        SessionLocal.configure(bind=engine)
+
+    if AsyncSessionLocal is not None and async_engine is None:
+        async_database_url = get_async_database_url()
+        async_engine = create_async_engine(async_database_url, **_engine_options(async_database_url, is_async=True))
+        instrument_engine(async_engine.sync_engine)
+        AsyncSessionLocal.configure(bind=async_engine)
+
+    return engine
+
+
+async def warm_up_pool() -> None:
+    """
+    預先建立連線池中的常駐連線，讓第一批請求不必承擔建立連線的延遲
+    資料庫暫時無法連線時只記錄警告，之後的請求會由 pool_pre_ping 重新建立連線
+    """
+    init_engines()
+    size = get_pool_limits()[0]
+
+    try:
+        if async_engine is not None:
+            connections = [await async_engine.connect() for _ in range(size)]
+            for connection in connections:
+                await connection.close()
+        else:
+            def _connect():
+                connections = [engine.connect() for _ in range(size)]
+                for connection in connections:
+                    connection.close()
+
+            await run_in_threadpool(_connect)
+    except Exception:
+        logger.warning("資料庫連線池預熱失敗", exc_info=True)
+
+
+def collect_pool_metrics():
+    samples = {"size": [], "checked_out": [], "overflow": []}
+    for label, current in (("sync", engine), ("async", async_engine and async_engine.sync_engine)):
+        pool = getattr(current, "pool", None)
+        if not isinstance(pool, QueuePool):
+            continue
+        samples["size"].append(({"engine": label}, pool.size()))
+        samples["checked_out"].append(({"engine": label}, pool.checkedout()))
+        samples["overflow"].append(({"engine": label}, max(pool.overflow(), 0)))
+
+    return [
+        ("db_pool_size", "gauge", "連線池常駐連線數", samples["size"]),
+        ("db_pool_checked_out", "gauge", "目前被借出的連線數", samples["checked_out"]),
+        ("db_pool_overflow", "gauge", "超出 pool_size 的臨時連線數", samples["overflow"]),
+    ]
+
+
+register_collector(collect_pool_metrics)
+
+
+async def dispose_engines() -> None:
+    if async_engine is not None:
+        await async_engine.dispose()
+    if engine is not None:
+        engine.dispose()
+
+
+class ThreadedStreamResult:
+    """對應 AsyncResult.partitions()，每次從伺服器端游標取一批資料都在執行緒池中完成"""
+
+    def __init__(self, result):
+        self._result = result
+
+    async def partitions(self, size: Optional[int] = None):
+        iterator = self._result.partitions(size)
+        while True:
+            partition = await run_in_threadpool(next, iterator, None)
+            if partition is None:
+                break
+            yield partition
+
+
+class ThreadedSession:
+    """
+    以 AsyncSession 相同的介面包裝同步 Session
+    所有會觸發 I/O 的呼叫都交給執行緒池，供 DATABASE_ASYNC=false 時與非同步模式對照壓測
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    async def execute(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, params, **kwargs)
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params, **kwargs)
+
+    async def scalars(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, statement, params, **kwargs)
+
+    async def stream(self, statement, params=None, **kwargs):
+        result = await run_in_threadpool(
+            self.sync_session.execute,
+            statement.execution_options(stream_results=True),
+            params,
+            **kwargs
+        )
+        return ThreadedStreamResult(result)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance):
+        await run_in_threadpool(self.sync_session.refresh, instance)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+    def expunge_all(self):
+        self.sync_session.expunge_all()
+
+
+def create_session() -> Session:
+    init_engines()
+    return SessionLocal()
+
+
 def get_db():
-    db = SessionLocal()
+    db = create_session()
     try:
         yield db
     finally:
         db.close()
         db.expunge_all()
+
+
+def create_async_session():
+    init_engines()
+    if AsyncSessionLocal is None:
+        return ThreadedSession(SessionLocal())
+    return AsyncSessionLocal()
+
+
+async def get_async_db():
+    db = create_async_session()
+    try:
+        yield db
+    finally:
+        await db.close()
+        db.expunge_all()
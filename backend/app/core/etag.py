@@ -0,0 +1,36 @@
+from datetime import datetime
+from fastapi import Request, Response
+
+# 瀏覽器保存回應但每次使用前都要重新驗證；private 讓共用快取（代理伺服器）不保存個人資料
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """
+    由版本資訊組成弱 ETag（W/"..."）
+    回應內容只由這些版本決定，不需要先序列化再計算雜湊；壓縮等轉換後弱 ETag 仍然有效
+    """
+    return 'W/"' + "-".join(
+        format(part.timestamp(), ".6f") if isinstance(part, datetime) else str(part)
+        for part in parts
+    ) + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 採弱比較：忽略 W/ 前綴，支援多個值與 *"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+
+def etag_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
@@ -1,7 +1,30 @@
+import hashlib
+import os
+import re
+import uuid
 from pathlib import Path
+from typing import Optional
+import anyio
+from sqlalchemy import select, func
+from .config import settings
+from .images import ImageProcessor, DERIVATIVES_ENABLED
+from ..models.user import User
+
+image_processor = ImageProcessor(max_workers=settings.AVATAR_WORKERS, max_pixels=settings.AVATAR_MAX_PIXELS)
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+class InvalidImageError(Exception):
+    pass
 
 
 class AvatarManager:
+    CHUNK_SIZE = 64 * 1024
+    # 內容定址的檔名：sha256 前 32 個十六進位字元
+    CONTENT_HASH_PATTERN = re.compile(r"^[0-9a-f]{32}$")
     ALLOWED_SIGNATURES = {
         b'\xFF\xD8\xFF': 'jpeg',
         b'\x89\x50\x4E\x47\x0D\x0A\x1A\x0A': 'png',
@@ -20,27 +43,169 @@ class AvatarManager:
         return False
 
     @staticmethod
-    def delete_avatar(db_path: str, upload_root: Path) -> bool:
-        try:
-            clean_path = db_path.replace("backend/", "").replace("\\", "/")
+    def _avatar_file(db_path: str, upload_root: Path) -> Optional[Path]:
+        clean_path = db_path.replace("backend/", "").replace("\\", "/")
 
-            if not clean_path.startswith("uploads/avatars/"):
-                return False
+        if not clean_path.startswith("uploads/avatars/"):
+            return None
 
-            filename = clean_path.split("/")[-1]
-            if ".." in filename or "/" in filename or "\\" in filename:
-                return False
+        filename = clean_path.split("/")[-1]
+        if ".." in filename or "/" in filename or "\\" in filename:
+            return None
+
+        file_path = upload_root / "avatars" / filename
+        expected_parent = (upload_root / "avatars").resolve()
 
-            file_path = upload_root / "avatars" / filename
-            expected_parent = (upload_root / "avatars").resolve()
+        if file_path.resolve().parent != expected_parent:
+            return None
+        return file_path
+
+    @staticmethod
+    def _delete_derivatives(file_path: Path) -> None:
+        """縮圖只以內容雜湊命名，<hash>.png 與 <hash>.jpg 共用；同一雜湊已沒有任何原檔時才刪除"""
+        if any(file_path.parent.glob(f"{file_path.stem}.*")):
+            return
+        for derivative in file_path.parent.glob(f"{file_path.stem}_*.webp"):
+            derivative.unlink(missing_ok=True)
 
-            if file_path.resolve().parent != expected_parent:
+    @staticmethod
+    def delete_avatar(db_path: str, upload_root: Path) -> bool:
+        try:
+            file_path = AvatarManager._avatar_file(db_path, upload_root)
+            if file_path is None:
                 return False
 
-            if file_path.exists() and file_path.is_file():
+            deleted = file_path.is_file()
+            if deleted:
                 file_path.unlink()
-                return True
-
+            AvatarManager._delete_derivatives(file_path)
+            return deleted
+        except (ValueError, OSError):
             return False
+
+    @staticmethod
+    def _move_aside(db_path: str, upload_root: Path) -> Optional[tuple[Path, Path]]:
+        """把頭像改名為隱藏檔，回傳 (原路徑, 新路徑)；檔案不存在時回傳 None"""
+        try:
+            file_path = AvatarManager._avatar_file(db_path, upload_root)
+            if file_path is None:
+                return None
+
+            aside_path = file_path.with_name(f".{file_path.name}.{uuid.uuid4()}.deleting")
+            os.replace(file_path, aside_path)
+            return file_path, aside_path
         except (ValueError, OSError):
+            return None
+
+    @staticmethod
+    def _discard(file_path: Path, aside_path: Path) -> None:
+        aside_path.unlink(missing_ok=True)
+        AvatarManager._delete_derivatives(file_path)
+
+    @staticmethod
+    def derivative_paths(db_path: Optional[str]) -> Optional[dict]:
+        """依頭像路徑推算各尺寸縮圖路徑；舊的 UUID 檔名沒有縮圖"""
+        if not db_path or not DERIVATIVES_ENABLED:
+            return None
+
+        directory, _, filename = db_path.rpartition("/")
+        stem = Path(filename).stem
+        if not AvatarManager.CONTENT_HASH_PATTERN.match(stem):
+            return None
+
+        return {str(size): f"{directory}/{stem}_{size}.webp" for size in settings.AVATAR_THUMBNAIL_SIZES}
+
+    @staticmethod
+    async def _count_references(db, db_path: str, exclude_user_id: Optional[int]) -> int:
+        query = select(func.count()).select_from(User).where(User.avatar == db_path)
+        if exclude_user_id is not None:
+            query = query.where(User.id != exclude_user_id)
+        return await db.scalar(query)
+
+    @staticmethod
+    async def delete_unreferenced_avatar(db, db_path: str, upload_root: Path, exclude_user_id: Optional[int] = None) -> bool:
+        """
+        相同內容的頭像會共用檔案，只有沒有其他用戶引用時才刪除
+
+        先把檔案改名移開再查一次引用：第一次查詢後才提交、沿用同一檔案的上傳會在第二次查詢被看到，檔案放回原位；
+        移開之後才提交的上傳由 restore_shared_upload 以自己保留的暫存檔還原
+        """
+        if await AvatarManager._count_references(db, db_path, exclude_user_id):
+            return False
+
+        moved = await anyio.to_thread.run_sync(AvatarManager._move_aside, db_path, upload_root)
+        if moved is None:
+            return False
+
+        file_path, aside_path = moved
+        if await AvatarManager._count_references(db, db_path, exclude_user_id):
+            await anyio.to_thread.run_sync(os.replace, aside_path, file_path)
             return False
+
+        await anyio.to_thread.run_sync(AvatarManager._discard, file_path, aside_path)
+        return True
+
+    @staticmethod
+    async def save_upload(file, dest_dir: Path, file_ext: str, max_size: int) -> tuple[str, Optional[Path]]:
+        """
+        分塊將上傳內容寫入暫存檔，再以 os.replace 原子地移到 dest_dir
+        第一塊即檢查檔頭，超過 max_size 立刻中止；記憶體用量只有一個 CHUNK_SIZE
+        檔名為內容雜湊，相同內容只保存一份；回傳 (檔名, 保留的暫存檔)
+
+        相同內容的檔案已存在時沿用它，但保留暫存檔直到頭像路徑提交：
+        提交前該檔案可能被其他請求當成無人引用而刪除，呼叫端提交後以 restore_shared_upload 確認，最後自行刪除暫存檔
+        新建立的檔案回傳的暫存檔為 None
+        """
+        tmp_path = dest_dir / f".{uuid.uuid4()}.part"
+        digest = hashlib.sha256()
+        size = 0
+
+        try:
+            async with await anyio.open_file(tmp_path, "wb") as out:
+                while chunk := await file.read(AvatarManager.CHUNK_SIZE):
+                    if size == 0 and not AvatarManager.validate_image(chunk):
+                        raise InvalidImageError()
+
+                    size += len(chunk)
+                    if size > max_size:
+                        raise UploadTooLargeError()
+
+                    digest.update(chunk)
+                    await out.write(chunk)
+
+            if size == 0:
+                raise InvalidImageError()
+
+            filename = f"{digest.hexdigest()[:32]}{file_ext}"
+            final_path = dest_dir / filename
+
+            if await anyio.to_thread.run_sync(final_path.exists):
+                return filename, tmp_path
+
+            await anyio.to_thread.run_sync(os.replace, tmp_path, final_path)
+            return filename, None
+        except BaseException:
+            await anyio.to_thread.run_sync(lambda: tmp_path.unlink(missing_ok=True))
+            raise
+
+    @staticmethod
+    async def restore_shared_upload(dest_dir: Path, filename: str, spare_path: Optional[Path]) -> bool:
+        """頭像路徑提交後呼叫：沿用的既有檔案若已被刪除，以保留的暫存檔還原；回傳是否還原"""
+        if spare_path is None:
+            return False
+
+        final_path = dest_dir / filename
+        if await anyio.to_thread.run_sync(final_path.exists):
+            return False
+
+        await anyio.to_thread.run_sync(os.replace, spare_path, final_path)
+        return True
+
+    @staticmethod
+    async def create_derivatives(dest_dir: Path, filename: str) -> list:
+        try:
+            return await image_processor.create_derivatives(
+                dest_dir / filename, dest_dir, Path(filename).stem, settings.AVATAR_THUMBNAIL_SIZES
+            )
+        except ValueError:
+            raise InvalidImageError()
@@ -0,0 +1,160 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+from .metrics import password_hash_seconds, password_hash_queue_wait_seconds
+
+# 此模組會在子行程中被重新載入，只能依賴 passlib 與只用標準函式庫的 metrics，不可引入設定或資料庫
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _hash_worker(password: str):
+    start = time.perf_counter()
+    hashed = pwd_context.hash(password)
+    return hashed, time.perf_counter() - start
+
+
+def _verify_worker(plain_password: str, hashed_password: str):
+    start = time.perf_counter()
+    result = pwd_context.verify(plain_password, hashed_password)
+    return result, time.perf_counter() - start
+
+
+def _warm_up_worker() -> None:
+    return None
+
+
+class HashPoolStats:
+    """
+    密碼雜湊統計：區分排隊等待時間與實際 bcrypt 計算時間
+    只在事件迴圈中更新，不需要加鎖
+    """
+
+    def __init__(self):
+        self.completed = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+
+    def record(self, operation: str, queue_wait: float, hash_time: float) -> None:
+        password_hash_seconds.labels(operation).observe(hash_time)
+        password_hash_queue_wait_seconds.labels(operation).observe(queue_wait)
+        self.completed += 1
+        self.queue_wait_total += queue_wait
+        self.hash_time_total += hash_time
+        self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+        self.hash_time_max = max(self.hash_time_max, hash_time)
+
+    def collect(self):
+        return [
+            ("password_hash_in_flight", "gauge", "進行中的 bcrypt 計算數", [({}, self.in_flight)]),
+            ("password_hash_rejected_total", "counter", "佇列已滿而拒絕的請求數", [({}, self.rejected)]),
+        ]
+
+    def snapshot(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "in_flight": self.in_flight,
+            "queue_wait_avg": self.queue_wait_total / completed,
+            "queue_wait_max": self.queue_wait_max,
+            "hash_time_avg": self.hash_time_total / completed,
+            "hash_time_max": self.hash_time_max,
+        }
+
+
+class PasswordHasher:
+    """
+    將 bcrypt 計算交給獨立的行程池，避免佔用事件迴圈與 Starlette 執行緒池
+    max_workers 為 0 時改用執行緒池（例如不允許建立子行程的環境）
+    """
+
+    def __init__(self, max_workers: int, queue_depth: int):
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self.stats = HashPoolStats()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # 使用 spawn 避免在多執行緒的父行程中 fork
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(max(self.max_workers, 1) + self.queue_depth)
+        return self._slots
+
+    async def _run(self, operation: str, func, *args):
+        slots = self._get_slots()
+
+        # 佇列已滿時直接拒絕，避免登入高峰把等待時間無限拉長
+        if slots.locked():
+            self.stats.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="系統繁忙，請稍後再試"
+            )
+
+        async with slots:
+            self.stats.in_flight += 1
+            submitted_at = time.perf_counter()
+            executor = None
+            try:
+                if self.max_workers > 0:
+                    loop = asyncio.get_running_loop()
+                    executor = self._get_executor()
+                    result, hash_time = await loop.run_in_executor(executor, func, *args)
+                else:
+                    result, hash_time = await run_in_threadpool(func, *args)
+            except BrokenProcessPool:
+                # 子行程異常結束時關閉損壞的行程池（回收管理執行緒與其餘子行程），下一次呼叫建立新的
+                # 同一批失敗的請求可能有多個，只有仍是目前行程池時才清除，避免關掉別人剛重建的
+                if self._executor is executor:
+                    self._executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            finally:
+                self.stats.in_flight -= 1
+
+            elapsed = time.perf_counter() - submitted_at
+            self.stats.record(operation, max(elapsed - hash_time, 0.0), hash_time)
+            return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", _hash_worker, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", _verify_worker, plain_password, hashed_password)
+
+    async def warm_up(self) -> None:
+        """預先啟動所有子行程，避免第一批登入請求承擔 spawn 成本"""
+        if self.max_workers <= 0:
+            return
+
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(
+            loop.run_in_executor(executor, _warm_up_worker)
+            for _ in range(self.max_workers)
+        ))
+
+    def shutdown(self) -> None:
+        """等待子行程結束，會阻塞呼叫端；在事件迴圈中請以 asyncio.to_thread 呼叫"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,100 @@
+import asyncio
+import multiprocessing
+import os
+import uuid
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Optional
+
+# 此模組會在子行程中被重新載入，不可引入設定或資料庫
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError
+except ImportError:  # 未安裝 Pillow 時只保存原圖，不產生縮圖
+    Image = None
+
+DERIVATIVES_ENABLED = Image is not None
+
+
+def _save_thumbnail(image, target: Path, size: int) -> None:
+    # 與原圖上傳相同的暫存命名：唯一且以 . 開頭，並發處理相同內容時不會互相覆寫，
+    # 靜態檔案服務也不會送出寫到一半的檔案
+    tmp = target.with_name(f".{target.stem}.{uuid.uuid4()}.part")
+    try:
+        ImageOps.fit(image, (size, size), Image.LANCZOS).save(tmp, "WEBP", quality=80, method=4)
+        os.replace(tmp, target)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _create_derivatives(source: str, dest_dir: str, stem: str, sizes: list, max_pixels: int) -> list:
+    """
+    產生正方形 WebP 縮圖，檔名為 <stem>_<size>.webp
+    stem 為內容雜湊，已存在的縮圖代表相同內容已處理過，直接略過
+    """
+    created = []
+    pending = [size for size in sizes if not (Path(dest_dir) / f"{stem}_{size}.webp").exists()]
+    if not pending:
+        return created
+
+    # Pillow 只在超過上限兩倍時丟出 DecompressionBombError，一倍到兩倍之間僅發出警告並完整解碼
+    # 子行程只處理頭像，直接設定上限並把警告視為錯誤，開啟時即拒絕
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            with Image.open(source) as image:
+                image = ImageOps.exif_transpose(image)
+                image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+                for size in pending:
+                    target = Path(dest_dir) / f"{stem}_{size}.webp"
+                    _save_thumbnail(image, target, size)
+                    created.append(target.name)
+    except (UnidentifiedImageError, Image.DecompressionBombError, Image.DecompressionBombWarning, OSError) as e:
+        raise ValueError(f"無法解析圖片：{e}")
+
+    return created
+
+
+class ImageProcessor:
+    """在獨立行程池中產生頭像縮圖，避免 CPU 密集的縮放阻塞事件迴圈"""
+
+    def __init__(self, max_workers: int, max_pixels: int):
+        self.max_workers = max_workers
+        self.max_pixels = max_pixels
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def create_derivatives(self, source: Path, dest_dir: Path, stem: str, sizes: list) -> list:
+        if not DERIVATIVES_ENABLED:
+            return []
+
+        loop = asyncio.get_running_loop()
+        args = (str(source), str(dest_dir), stem, list(sizes), self.max_pixels)
+        # 子行程異常結束（例如 OOM）後行程池即損壞，關閉後以新的行程池重試一次
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                return await loop.run_in_executor(executor, _create_derivatives, *args)
+            except BrokenProcessPool:
+                # 同 PasswordHasher：只有仍是目前行程池時才清除，避免關掉其他請求剛重建的
+                if self._executor is executor:
+                    self._executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+                if attempt:
+                    raise
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
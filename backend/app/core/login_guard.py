@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import math
+import time
+from collections import Counter, OrderedDict
+from contextlib import suppress
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from .config import settings
+from .audit import audit_buffer
+from .metrics import register_collector
+from .rate_limit import create_shared_storage
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryWindows:
+    """
+    每個 worker 各自的計數表：每個鍵只存 [視窗編號, 本視窗次數, 上一視窗次數]
+    以 LRU 限制鍵的數量，大量不同的郵箱 / IP 也不會讓記憶體無限增長
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._entries: OrderedDict[str, list] = OrderedDict()
+
+    # 純記憶體操作，直接在事件迴圈上執行
+    blocking = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _roll(entry: list, window: int) -> None:
+        if entry[0] == window:
+            return
+        entry[2] = entry[1] if entry[0] == window - 1 else 0
+        entry[1] = 0
+        entry[0] = window
+
+    def hit(self, key: str, window: int) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [window, 0, 0]
+        else:
+            self._roll(entry, window)
+            self._entries.move_to_end(key)
+        entry[1] += 1
+
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+
+    def counts(self, key: str, window: int) -> tuple[int, int]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return 0, 0
+        self._roll(entry, window)
+        return entry[2], entry[1]
+
+    def clear(self, key: str, window: int) -> None:
+        self._entries.pop(key, None)
+
+    def prune(self, window: int) -> None:
+        """移除兩個視窗以前的鍵，它們對滑動視窗的估計值已經沒有影響"""
+        for key in [key for key, entry in self._entries.items() if entry[0] < window - 1]:
+            del self._entries[key]
+
+
+class StorageWindows:
+    """
+    以 limits 的儲存後端（與限流相同的 sqlite:/// 或 redis://）保存每個視窗的計數，讓多個 worker 共用
+    每個視窗一個鍵，存活兩個視窗長度後由儲存後端自行過期
+    """
+
+    PREFIX = "login_guard"
+    # redis / sqlite 的存取是同步網路或檔案 I/O，需交給執行緒池
+    blocking = True
+
+    def __init__(self, storage, window_seconds: int):
+        self.storage = storage
+        self.window_seconds = window_seconds
+
+    def __len__(self) -> int:
+        return 0
+
+    def _key(self, key: str, window: int) -> str:
+        return f"{self.PREFIX}:{key}:{window}"
+
+    def hit(self, key: str, window: int) -> None:
+        self.storage.incr(self._key(key, window), self.window_seconds * 2)
+
+    def counts(self, key: str, window: int) -> tuple[int, int]:
+        return self.storage.get(self._key(key, window - 1)), self.storage.get(self._key(key, window))
+
+    def clear(self, key: str, window: int) -> None:
+        self.storage.clear(self._key(key, window - 1))
+        self.storage.clear(self._key(key, window))
+
+    def prune(self, window: int) -> None:
+        pass
+
+
+class LoginGuard:
+    """
+    登入失敗追蹤：以滑動視窗計數器分別統計每個郵箱與每個 IP 的失敗次數
+    估計值 = 上一視窗次數 × 尚未滑出的比例 + 本視窗次數，每個鍵只需要兩個整數
+
+    達到上限的郵箱或 IP 在 check() 就被拒絕，不查詢資料庫也不計算 bcrypt
+    被拒絕的嘗試不逐筆寫入審計日誌，由背景任務每 summary_interval 秒彙總為一筆 login_blocked
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        window_seconds: int,
+        max_failures_per_email: int,
+        max_failures_per_ip: int,
+        windows,
+        summary_interval: float = 60
+    ):
+        self.enabled = enabled
+        self.window_seconds = window_seconds
+        self.max_failures_per_email = max_failures_per_email
+        self.max_failures_per_ip = max_failures_per_ip
+        self.windows = windows
+        self.summary_interval = summary_interval
+        self.blocked = 0
+        self._suppressed: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+
+    def _identities(self, email: str, ip_address: Optional[str]) -> list[tuple[str, str, int]]:
+        identities = []
+        if self.max_failures_per_email > 0:
+            identities.append(("email", email.strip().lower(), self.max_failures_per_email))
+        if ip_address and self.max_failures_per_ip > 0:
+            identities.append(("ip", ip_address, self.max_failures_per_ip))
+        return identities
+
+    def _retry_after(self, previous: int, current: int, limit: int, elapsed: float) -> Optional[int]:
+        """尚未鎖定回傳 None，否則回傳估計值降到上限以下所需的秒數"""
+        fraction = elapsed / self.window_seconds
+        if previous * (1 - fraction) + current < limit:
+            return None
+
+        if current >= limit:
+            # 本視窗已達上限：等到下個視窗，本視窗的次數再滑出到低於上限
+            wait = (1 - fraction) + (1 - limit / current)
+        else:
+            wait = (1 - (limit - current) / previous) - fraction
+        return max(math.ceil(wait * self.window_seconds), 1)
+
+    async def _call(self, func, *args):
+        if self.windows.blocking:
+            return await run_in_threadpool(func, *args)
+        return func(*args)
+
+    def _read_counts(self, keys: list[str], window: int) -> list[tuple[int, int]]:
+        return [self.windows.counts(key, window) for key in keys]
+
+    def _hit_all(self, keys: list[str], window: int) -> None:
+        for key in keys:
+            self.windows.hit(key, window)
+
+    async def check(self, email: str, ip_address: Optional[str]) -> Optional[int]:
+        """回傳需要等待的秒數；None 代表未鎖定，可以繼續驗證密碼"""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        window, elapsed = divmod(now, self.window_seconds)
+        window = int(window)
+
+        identities = self._identities(email, ip_address)
+        counts = await self._call(self._read_counts, [f"{kind}:{value}" for kind, value, _ in identities], window)
+
+        for (kind, value, limit), (previous, current) in zip(identities, counts):
+            retry_after = self._retry_after(previous, current, limit, elapsed)
+            if retry_after is not None:
+                self.blocked += 1
+                self._suppressed[(kind, value)] += 1
+                return retry_after
+        return None
+
+    async def record_failure(self, email: str, ip_address: Optional[str]) -> None:
+        if not self.enabled:
+            return
+
+        window = int(time.time() // self.window_seconds)
+        keys = [f"{kind}:{value}" for kind, value, _ in self._identities(email, ip_address)]
+        await self._call(self._hit_all, keys, window)
+
+    async def record_success(self, email: str) -> None:
+        """登入成功只清除郵箱的計數；同一 IP 的其他失敗仍然保留"""
+        if not self.enabled or self.max_failures_per_email <= 0:
+            return
+
+        window = int(time.time() // self.window_seconds)
+        await self._call(self.windows.clear, f"email:{email.strip().lower()}", window)
+
+    def flush_summary(self) -> int:
+        """把累計的拒絕次數寫成彙總審計日誌，回傳寫入的筆數"""
+        suppressed, self._suppressed = self._suppressed, Counter()
+        for (kind, value), count in suppressed.items():
+            label = "郵箱" if kind == "email" else "IP"
+            audit_buffer.record(
+                user_id=None,
+                username=None,
+                action="login_blocked",
+                ip_address=value if kind == "ip" else None,
+                user_agent=None,
+                details=f"{label} {value} 登入失敗次數過多，已拒絕 {count} 次"
+            )
+        return len(suppressed)
+
+    async def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        self.flush_summary()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.summary_interval)
+            try:
+                self.flush_summary()
+                self.windows.prune(int(time.time() // self.window_seconds))
+            except Exception:
+                logger.exception("寫入登入拒絕彙總失敗")
+
+    def collect(self):
+        return [
+            ("login_guard_tracked_keys", "gauge", "記憶體中追蹤的郵箱 / IP 數（共用儲存時為 0）", [({}, len(self.windows))]),
+            ("login_guard_blocked_total", "counter", "因登入失敗次數過多而直接拒絕的請求數", [({}, self.blocked)]),
+        ]
+
+
+def _create_windows():
+    storage = create_shared_storage() if settings.LOGIN_GUARD_SHARED else None
+    if storage is None:
+        return MemoryWindows(settings.LOGIN_GUARD_MAX_KEYS)
+    return StorageWindows(storage, settings.LOGIN_GUARD_WINDOW_SECONDS)
+
+
+login_guard = LoginGuard(
+    enabled=settings.LOGIN_GUARD_ENABLED,
+    window_seconds=settings.LOGIN_GUARD_WINDOW_SECONDS,
+    max_failures_per_email=settings.LOGIN_GUARD_MAX_FAILURES_PER_EMAIL,
+    max_failures_per_ip=settings.LOGIN_GUARD_MAX_FAILURES_PER_IP,
+    windows=_create_windows(),
+    summary_interval=settings.LOGIN_GUARD_SUMMARY_SECONDS
+)
+register_collector(login_guard.collect)
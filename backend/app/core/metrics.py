@@ -0,0 +1,204 @@
+import bisect
+import ipaddress
+import threading
+import time
+from typing import Callable, Iterable
+
+# 此模組只依賴標準函式庫，可被 hashing 等會在子行程中重新載入的模組引入
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """
+    累積直方圖：observe 只做一次二分搜尋與兩次加法
+    事件迴圈內沒有競爭，鎖只在執行緒池（同步資料庫模式）同時寫入時才有實際作用
+    """
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class MetricFamily:
+    """同名指標依標籤值分成多個子指標；只有第一次出現的標籤組合需要加鎖建立"""
+
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: tuple, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._children: dict = {}
+        self._lock = threading.Lock()
+        _families.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = Histogram(self.buckets) if self.kind == "histogram" else Counter()
+                    self._children[values] = child
+        return child
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+        for values, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, values))
+            if self.kind == "counter":
+                yield f"{self.name}{_format_labels(labels)} {_format_value(child.value)}"
+                continue
+
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(child.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+
+_families: list[MetricFamily] = []
+_collectors: list[Callable[[], Iterable[tuple]]] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def register_collector(collector: Callable[[], Iterable[tuple]]) -> None:
+    """
+    註冊抓取時才計算的指標（連線池大小、佇列長度等）
+    collector 回傳 (名稱, 類型, 說明, [(標籤 dict, 數值), ...]) 的序列
+    """
+    _collectors.append(collector)
+
+
+def parse_networks(values: Iterable[str]) -> tuple:
+    return tuple(ipaddress.ip_network(value, strict=False) for value in values)
+
+
+def address_allowed(host, networks: tuple) -> bool:
+    """host 為直接連線的用戶端位址；經過反向代理時是代理伺服器的位址"""
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+def render_metrics() -> str:
+    """只包含目前這個 worker 的數值；多個 worker 之間不彙總"""
+    lines = []
+    for family in _families:
+        lines.extend(family.render())
+
+    for collector in _collectors:
+        for name, kind, documentation, samples in collector():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+http_requests_total = MetricFamily(
+    "http_requests_total", "HTTP 請求數", "counter", ("method", "route", "status")
+)
+http_request_duration_seconds = MetricFamily(
+    "http_request_duration_seconds", "HTTP 請求處理時間（秒）", "histogram", ("method", "route")
+)
+db_pool_checkout_seconds = MetricFamily(
+    "db_pool_checkout_seconds", "從連線池取得連線的等待時間（秒，含建立新連線）", "histogram", ("engine",)
+)
+password_hash_seconds = MetricFamily(
+    "password_hash_seconds", "bcrypt 計算時間（秒）", "histogram", ("operation",),
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0)
+)
+password_hash_queue_wait_seconds = MetricFamily(
+    "password_hash_queue_wait_seconds", "bcrypt 在行程池排隊的時間（秒）", "histogram", ("operation",)
+)
+
+
+class MetricsMiddleware:
+    """
+    純 ASGI 中介軟體：記錄每個請求的處理時間與狀態碼
+    路由標籤使用路由樣板（/api/admin/users/{user_id}），不使用實際路徑，避免標籤數量無限增長
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        root_path = scope.get("root_path", "")
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = route_label(scope, root_path)
+            method = scope["method"]
+            http_request_duration_seconds.labels(method, route).observe(elapsed)
+            http_requests_total.labels(method, route, str(status_code)).inc()
+
+
+def route_label(scope, root_path: str) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # 掛載的子應用（例如 /api/uploads）沒有 route，以掛載路徑為標籤
+    if scope.get("root_path", "") != root_path:
+        return scope["root_path"]
+    return "unmatched"
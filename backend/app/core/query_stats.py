@@ -0,0 +1,122 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .config import settings
+from .metrics import route_label
+
+logger = logging.getLogger(__name__)
+
+# SQLite 為 ?、psycopg2 為 %(name)s、asyncpg 為 $1
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|\$\d+|\?")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\?(?:\s*,\s*\?)*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(statement: str) -> str:
+    """把參數與常數換成 ?，IN 清單縮成 (?...)，讓不同長度的 IN 查詢歸為同一類"""
+    sql = _WHITESPACE.sub(" ", statement).strip()
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _PLACEHOLDER_LIST.sub("(?...)", sql)
+
+
+class QueryStats:
+    """單一請求內的 SQL 統計；物件本身放在 contextvar 中，執行緒池複製的 context 也會更新同一個物件"""
+    __slots__ = ("count", "duration", "statements", "scope", "root_path")
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: Counter = Counter()
+        self.scope = scope
+        self.root_path = scope.get("root_path", "") if scope else ""
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.duration += elapsed
+        # 熱路徑只以原始 SQL 字串計數，請求結束時才正規化
+        self.statements[statement] += 1
+
+    @property
+    def route(self) -> str:
+        return route_label(self.scope, self.root_path) if self.scope is not None else "-"
+
+    def server_timing(self) -> bytes:
+        return f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries"'.encode()
+
+    def repeated_statements(self, threshold: int) -> list[tuple[str, int]]:
+        grouped: Counter = Counter()
+        for statement, count in self.statements.items():
+            grouped[normalize_sql(statement)] += count
+        return [(sql, count) for sql, count in grouped.most_common() if count >= threshold]
+
+
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started_at
+
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+    if settings.SQL_SLOW_QUERY_MS > 0 and elapsed * 1000 >= settings.SQL_SLOW_QUERY_MS:
+        logger.warning(
+            "慢查詢 %.1f ms [%s] %s",
+            elapsed * 1000,
+            stats.route if stats is not None else "-",
+            normalize_sql(statement)
+        )
+
+
+def instrument_engine(engine: Engine) -> None:
+    """非同步引擎請傳入 async_engine.sync_engine"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryStatsMiddleware:
+    """
+    純 ASGI 中介軟體：為每個請求建立 QueryStats
+    回應開始時附加 Server-Timing: db;dur=...，請求結束後回報重複執行的相似查詢（疑似 N+1）
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(scope)
+        token = current_query_stats.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and stats.count:
+                message["headers"] = [*message.get("headers", []), (b"server-timing", stats.server_timing())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_query_stats.reset(token)
+
+        if settings.SQL_REPEATED_QUERY_THRESHOLD > 0:
+            for sql, count in stats.repeated_statements(settings.SQL_REPEATED_QUERY_THRESHOLD):
+                logger.warning("疑似 N+1：%s 執行了 %d 次相似查詢 %s", stats.route, count, sql)
@@ -0,0 +1,108 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+from typing import Optional
+from limits.storage import Storage, storage_from_string
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+from .config import settings
+
+
+class SQLiteStorage(Storage):
+    """
+    以 SQLite（WAL + mmap）保存固定視窗計數器的 limits 儲存後端
+    同一台機器上的多個 uvicorn worker 共用同一個檔案，限流次數不再是 N 倍，重啟後也不會歸零
+
+    連線字串：sqlite:///相對路徑.db 或 sqlite:////絕對路徑.db
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+    CLEANUP_EVERY = 1000
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        # 與 SQLAlchemy 相同：去掉第一個斜線，sqlite:////x 即為絕對路徑 /x
+        self.path = Path(urlparse(uri).path[1:] or "ratelimit.db")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._calls = 0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 連線不可跨執行緒共用，每個執行緒各開一條
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA mmap_size=67108864")
+            self._local.conn = conn
+        return conn
+
+    def incr(self, key: str, expiry: int, amount: int = 1, **kwargs) -> int:
+        now = time.time()
+        conn = self._connection()
+
+        # 單一 UPSERT 敘述即為原子操作，視窗過期時重新計數
+        value = conn.execute(
+            "INSERT INTO rate_limits (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            "value = CASE WHEN expires_at <= ? THEN excluded.value ELSE value + excluded.value END, "
+            "expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END "
+            "RETURNING value",
+            (key, amount, now + expiry, now, now)
+        ).fetchone()[0]
+
+        self._calls += 1
+        if self._calls % self.CLEANUP_EVERY == 0:
+            conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+
+        return value
+
+    def get(self, key: str) -> int:
+        row = self._connection().execute(
+            "SELECT value FROM rate_limits WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        row = self._connection().execute(
+            "SELECT expires_at FROM rate_limits WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self) -> bool:
+        try:
+            self._connection().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        return self._connection().execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key: str) -> None:
+        self._connection().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+
+def create_shared_storage() -> Optional[Storage]:
+    """
+    供其他模組在多個 worker 之間共用計數（登入失敗、用戶快取失效標記）
+    RATE_LIMIT_STORAGE_URI 為 memory:// 時每個行程各自一份，無法共用，回傳 None
+    """
+    if settings.RATE_LIMIT_STORAGE_URI.startswith("memory://"):
+        return None
+    return storage_from_string(settings.RATE_LIMIT_STORAGE_URI)
+
+
+# 全應用共用同一個 Limiter；RATE_LIMIT_STORAGE_URI 可設為 memory://、sqlite:///... 或 redis://...
+limiter = Limiter(key_func=get_remote_address, storage_uri=settings.RATE_LIMIT_STORAGE_URI)
@@ -0,0 +1,118 @@
+import asyncio
+import gzip
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from sqlalchemy import select, delete
+from starlette.concurrency import run_in_threadpool
+from .config import settings
+from .database import create_session
+from .audit_export import EXPORT_COLUMNS, rows_to_ndjson
+from .audit_rollups import RollupCounts, rollup_statements
+from ..models.audit_log import AuditLog
+
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 fcntl，只能依賴單一行程執行
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = Path(__file__).parent.parent.parent / settings.AUDIT_ARCHIVE_DIR
+
+
+def _month_bucket(created_at: datetime) -> str:
+    return f"{created_at:%Y-%m}"
+
+
+def _append_archive(archive_dir: Path, bucket: str, rows: list) -> None:
+    """
+    以 gzip member 追加寫入月份封存檔（多個 member 串接仍是合法的 gzip 檔）
+    fsync 之後才回傳，確保刪除資料庫中的列之前資料已經落地
+    """
+    path = archive_dir / f"{bucket}.ndjson.gz"
+    with open(path, "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="ab") as gz:
+            gz.write(rows_to_ndjson(rows))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def archive_audit_logs(
+    older_than_days: int,
+    batch_size: int = 5000,
+    archive_dir: Path = ARCHIVE_DIR,
+    max_batches: int | None = None
+) -> dict:
+    """
+    將超過保留天數的審計日誌依月份封存為 gzip NDJSON，再分批刪除
+
+    每一批都是「讀取 → 寫入封存檔 → 刪除 → commit」的短交易，不會長時間持有鎖
+    若在寫檔後、刪除前中斷，下次執行會重複封存同一批資料（at-least-once），可依 id 去重
+    """
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    stats = {"archived": 0, "batches": 0, "buckets": set(), "skipped": False}
+
+    with open(archive_dir / ".lock", "w") as lock_file:
+        # 多個 worker 同時執行時只讓一個進行封存
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                stats["skipped"] = True
+                return stats
+
+        while max_batches is None or stats["batches"] < max_batches:
+            with create_session() as db:
+                rows = db.execute(
+                    select(*EXPORT_COLUMNS)
+                    .where(AuditLog.created_at < cutoff)
+                    .order_by(AuditLog.created_at, AuditLog.id)
+                    .limit(batch_size)
+                ).all()
+
+                if not rows:
+                    break
+
+                buckets = defaultdict(list)
+                for row in rows:
+                    buckets[_month_bucket(row.created_at)].append(row)
+
+                for bucket, bucket_rows in buckets.items():
+                    _append_archive(archive_dir, bucket, bucket_rows)
+
+                db.execute(delete(AuditLog).where(AuditLog.id.in_([row.id for row in rows])))
+                # 彙總表與 audit_logs 保持一致：封存刪除的事件在同一個交易中扣除
+                if settings.AUDIT_ROLLUPS_ENABLED:
+                    counts = RollupCounts()
+                    counts.add_rows(rows, count=-1)
+                    for statement, params in rollup_statements(counts):
+                        db.execute(statement, params)
+                db.commit()
+
+            stats["archived"] += len(rows)
+            stats["batches"] += 1
+            stats["buckets"].update(buckets)
+
+    stats["buckets"] = sorted(stats["buckets"])
+    return stats
+
+
+async def run_retention_job(interval_hours: float) -> None:
+    """背景定期封存任務，由 lifespan 啟動並在關閉時取消"""
+    while True:
+        try:
+            stats = await run_in_threadpool(
+                archive_audit_logs,
+                settings.AUDIT_RETENTION_DAYS,
+                settings.AUDIT_RETENTION_BATCH_SIZE
+            )
+            if stats["archived"]:
+                logger.info("已封存 %d 筆審計日誌：%s", stats["archived"], ", ".join(stats["buckets"]))
+        except Exception:
+            logger.exception("審計日誌封存失敗")
+
+        await asyncio.sleep(interval_hours * 3600)
@@ -0,0 +1,118 @@
+from sqlalchemy import inspect, text, select, update, func, String, type_coerce
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import aliased
+from sqlalchemy.schema import CreateColumn
+from .database import Base
+from ..models.user import User  # noqa: F401  註冊到 Base.metadata
+from ..models.audit_log import AuditLog  # noqa: F401
+from ..models.audit_rollup import AuditLogHourlyRollup  # noqa: F401
+from ..models.table_version import TableVersion  # noqa: F401
+
+
+# 已被複合索引取代的舊索引：保留只會增加每次寫入的索引維護成本
+SUPERSEDED_INDEXES = {
+    # 由 ix_audit_logs_action_created_at_id 與 ix_audit_logs_created_at_id 取代
+    "audit_logs": ("ix_audit_logs_action", "ix_audit_logs_created_at"),
+}
+
+
+def bootstrap_schema(engine: Engine) -> list[str]:
+    """
+    建立缺少的資料表，並為既有資料表補上新增的欄位與索引，移除 SUPERSEDED_INDEXES 列出的舊索引
+    不會刪除或修改既有欄位；回傳執行過的變更說明
+    """
+    changes = []
+    existing_tables = set(inspect(engine).get_table_names())
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            table.create(bind=engine)
+            changes.append(f"建立資料表 {table.name}")
+            continue
+
+        inspector = inspect(engine)
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+
+        with engine.begin() as connection:
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    changes.append(f"略過 {table.name}.{column.name}：非空欄位需要手動遷移")
+                    continue
+
+                # CreateColumn 會帶上型別、DEFAULT 與 NOT NULL
+                column_ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column_ddl}'))
+                changes.append(f"新增欄位 {table.name}.{column.name}")
+
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=engine)
+                changes.append(f"建立索引 {index.name}")
+
+        superseded = [name for name in SUPERSEDED_INDEXES.get(table.name, ()) if name in existing_indexes]
+        if superseded:
+            with engine.begin() as connection:
+                for name in superseded:
+                    connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+                    changes.append(f"移除已被取代的索引 {name}")
+
+    return changes
+
+
+# keyset 分頁以 (created_at, id) 比較的時間欄位
+KEYSET_TIMESTAMP_COLUMNS = (User.__table__.c.created_at, AuditLog.__table__.c.created_at)
+
+
+def normalize_sqlite_timestamps(engine: Engine) -> int:
+    """
+    SQLite 以字串保存時間：CURRENT_TIMESTAMP 寫入的是 'YYYY-MM-DD HH:MM:SS'，
+    SQLAlchemy 綁定的值則是 'YYYY-MM-DD HH:MM:SS.ffffff'，兩者以字串比較時同一秒的列會比錯
+    將舊資料補齊到微秒格式，回傳更新的筆數；其他資料庫不需要處理
+    """
+    if engine.dialect.name != "sqlite":
+        return 0
+
+    updated = 0
+    with engine.begin() as connection:
+        for column in KEYSET_TIMESTAMP_COLUMNS:
+            statement = (
+                update(column.table)
+                .where(func.length(column) == 19)
+                .values({column.name: type_coerce(column, String).concat(".000000")})
+            )
+            updated += connection.execute(statement).rowcount
+    return updated
+
+
+def backfill_audit_usernames(engine: Engine, batch_size: int = 5000) -> int:
+    """
+    新增 audit_logs.username 之前寫入的列依 user_id 從 users 補上用戶名，回傳更新的筆數
+    分批提交，避免在大表上長時間持有鎖；用戶已刪除（user_id 為 NULL 或已不存在）的列無法補上
+    """
+    pending = aliased(AuditLog)
+    batch = (
+        select(pending.id)
+        .where(
+            pending.username.is_(None),
+            pending.user_id.is_not(None),
+            select(User.id).where(User.id == pending.user_id).exists()
+        )
+        .limit(batch_size)
+    )
+    statement = (
+        update(AuditLog)
+        .where(AuditLog.id.in_(batch.scalar_subquery()))
+        .values(username=select(User.username).where(User.id == AuditLog.user_id).scalar_subquery())
+        .execution_options(synchronize_session=False)
+    )
+
+    updated = 0
+    while True:
+        with engine.begin() as connection:
+            rowcount = connection.execute(statement).rowcount
+        updated += rowcount
+        if rowcount < batch_size:
+            return updated
@@ -1,14 +1,22 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import jwt, JWTError
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status, Cookie
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from .config import settings
-from .database import get_db
+from .database import get_async_db
+from .hashing import pwd_context, PasswordHasher
+from .user_cache import user_cache
+from .token_versions import token_versions
+from .metrics import register_collector
 from ..models.user import User
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    queue_depth=settings.PASSWORD_HASH_QUEUE_DEPTH
+)
+register_collector(password_hasher.stats.collect)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -19,6 +27,14 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify(plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.hash(password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
 
@@ -33,9 +49,9 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-def get_current_user(
+async def get_current_user(
     access_token: Optional[str] = Cookie(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """
     從 HttpOnly Cookie 中解析 Token 並獲取當前用戶
@@ -58,6 +74,8 @@ def get_current_user(
             algorithms=[settings.ALGORITHM]
         )
         user_id: str = payload.get("sub")
+        # 加入 token_version 之前簽發的 token 沒有 ver，視為版本 0
+        token_version = payload.get("ver", 0)
 
         if user_id is None:
             raise credentials_exception
@@ -70,23 +88,44 @@ def get_current_user(
     except (ValueError, TypeError):
         raise credentials_exception
 
-    # 從資料庫查找用戶
-    user = db.query(User).filter(User.id == user_id_int).first()
+    # 無狀態模式：版本表中有此用戶時直接判斷停用與撤銷，快取命中時整個請求不需要 SQL
+    entry = token_versions.get(user_id_int) if token_versions.enabled else None
+    if entry is not None:
+        _check_token_state(token_version, *entry, credentials_exception)
+
+    # 優先使用快取的用戶快照，未命中才查詢資料庫
+    user = await user_cache.get(user_id_int)
 
     if user is None:
-        raise credentials_exception
+        user = await db.scalar(select(User).where(User.id == user_id_int))
+
+        if user is None:
+            raise credentials_exception
+
+        await user_cache.set(user)
+        token_versions.update(user.id, user.token_version, user.is_active)
+        # 剛從資料庫讀到的狀態最新，無論版本表是否有資料都再檢查一次
+        _check_token_state(token_version, user.token_version, user.is_active, credentials_exception)
+    elif entry is None:
+        _check_token_state(token_version, user.token_version, user.is_active, credentials_exception)
+
+    return user
 
-    # 檢查用戶是否被停用
-    if not user.is_active:
+
+def _check_token_state(token_version: int, current_version: int, is_active: bool, credentials_exception: HTTPException) -> None:
+    # 停用同時會遞增版本，先檢查停用，讓被停用的用戶收到明確的 403 而不是一般的 401
+    if not is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="帳號已被停用，請聯繫管理員"
         )
 
-    return user
+    # 管理員重置密碼或撤銷後版本遞增，舊 token 一律視為已登出
+    if token_version != current_version:
+        raise credentials_exception
 
 
-def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,31 @@
+from typing import Any, Optional
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # 未安裝 orjson 時改用 pydantic-core 序列化，輸出格式相同
+    orjson = None
+
+# 全應用預設的回應類別
+DefaultJSONResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+_any_adapter = TypeAdapter(Any)
+
+
+def dumps(content: Any) -> bytes:
+    """
+    直接把 dict / list / datetime 編碼成 JSON，不經過 jsonable_encoder
+    OPT_UTC_Z 讓 UTC 時間輸出為 ...Z，與 pydantic 的格式一致
+    """
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+    return _any_adapter.dump_json(content)
+
+
+def json_response(content: Any, headers: Optional[dict] = None) -> Response:
+    """
+    回傳已編碼好的 JSON；路由直接回傳 Response 時 FastAPI 會略過 response_model 的驗證與序列化
+    呼叫端必須自行確保內容與 response_model 宣告的結構一致
+    """
+    return Response(dumps(content), media_type="application/json", headers=headers)
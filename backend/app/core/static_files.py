@@ -0,0 +1,233 @@
+import mimetypes
+import os
+import re
+import stat
+from collections import OrderedDict
+from email.utils import formatdate
+from pathlib import Path
+from typing import Optional
+import anyio
+
+# 內容雜湊（含縮圖 _<size> 後綴）或 UUID 檔名，內容永遠不會改變
+IMMUTABLE_NAME_PATTERN = re.compile(
+    r"^(?:[0-9a-f]{32}(?:_\d+)?|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})$"
+)
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+IMMUTABLE_CACHE_CONTROL = b"public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = b"public, max-age=0, must-revalidate"
+CHUNK_SIZE = 64 * 1024
+
+
+class FileCache:
+    """
+    小檔案的 LRU 記憶體快取，以總位元組數為上限
+    只存放內容不會改變的檔案，命中時不需要比對 mtime；
+    但檔案可能被刪除（可能是其他 worker 刪的），使用前仍由 UploadFiles 先 stat 確認存在
+    """
+
+    def __init__(self, max_bytes: int, max_file_size: int):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.current_bytes = 0
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        content = self._entries.get(key)
+        if content is not None:
+            self._entries.move_to_end(key)
+        return content
+
+    def discard(self, key: str) -> None:
+        content = self._entries.pop(key, None)
+        if content is not None:
+            self.current_bytes -= len(content)
+
+    def put(self, key: str, content: bytes) -> None:
+        if len(content) > self.max_file_size or len(content) > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.current_bytes -= len(old)
+
+        self._entries[key] = content
+        self.current_bytes += len(content)
+
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= len(evicted)
+
+
+class UploadFiles:
+    """
+    上傳檔案專用的 ASGI 靜態檔案服務
+    - 內容定址 / UUID 檔名回傳一年的 immutable 快取與強 ETag
+    - If-None-Match 回應 304，支援單一區段的 Range 請求（206 / 416）
+    - 伺服器支援 ASGI zerocopysend / pathsend 擴充時直接交給 sendfile
+    - 可選的小檔案 LRU 記憶體快取
+    """
+
+    def __init__(self, directory: Path, cache_max_bytes: int = 0, cache_max_file_size: int = 0):
+        self.directory = Path(directory).resolve()
+        self.cache = FileCache(cache_max_bytes, cache_max_file_size) if cache_max_bytes > 0 else None
+
+    async def __call__(self, scope, receive, send):
+        assert scope["type"] == "http"
+
+        method = scope["method"]
+        if method not in ("GET", "HEAD"):
+            await self._send_empty(send, 405, [(b"allow", b"GET, HEAD")])
+            return
+
+        file_path = self._resolve(scope)
+        if file_path is None:
+            await self._send_empty(send, 404)
+            return
+
+        name = file_path.name
+        immutable = IMMUTABLE_NAME_PATTERN.match(file_path.stem) is not None
+
+        # 快取命中也先 stat：頭像刪除後不能繼續從記憶體送出
+        try:
+            file_stat = await anyio.to_thread.run_sync(os.stat, file_path)
+        except (FileNotFoundError, NotADirectoryError):
+            if self.cache is not None:
+                self.cache.discard(name)
+            await self._send_empty(send, 404)
+            return
+        if not stat.S_ISREG(file_stat.st_mode):
+            await self._send_empty(send, 404)
+            return
+
+        cached = self.cache.get(name) if self.cache is not None and immutable else None
+        size = len(cached) if cached is not None else file_stat.st_size
+        etag = f'"{file_path.stem}"' if immutable else f'"{file_stat.st_mtime_ns:x}-{size:x}"'
+
+        request_headers = dict(scope["headers"])
+        headers = [
+            (b"etag", etag.encode()),
+            (b"cache-control", IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL),
+            (b"accept-ranges", b"bytes"),
+            (b"last-modified", formatdate(file_stat.st_mtime, usegmt=True).encode()),
+        ]
+
+        if self._not_modified(request_headers.get(b"if-none-match"), etag):
+            await self._send_empty(send, 304, headers)
+            return
+
+        content_type, _ = mimetypes.guess_type(name)
+        headers.append((b"content-type", (content_type or "application/octet-stream").encode()))
+
+        status, start, length = 200, 0, size
+        range_header = request_headers.get(b"range")
+        if_range = request_headers.get(b"if-range")
+        if range_header and (if_range is None or if_range.decode() == etag):
+            byte_range = self._parse_range(range_header.decode(), size)
+            if byte_range is None:
+                await self._send_empty(send, 416, headers + [(b"content-range", f"bytes */{size}".encode())])
+                return
+            if byte_range != (0, size):
+                status = 206
+                start, length = byte_range[0], byte_range[1] - byte_range[0]
+                headers.append((b"content-range", f"bytes {start}-{start + length - 1}/{size}".encode()))
+
+        headers.append((b"content-length", str(length).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+
+        if method == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if cached is not None:
+            await send({"type": "http.response.body", "body": cached[start:start + length]})
+            return
+
+        await self._send_file(scope, send, file_path, name, start, length, size, immutable)
+
+    def _resolve(self, scope) -> Optional[Path]:
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+
+        # 隱藏檔不對外提供：上傳中的 .<uuid>.part、刪除中的 .<name>.<uuid>.deleting 與 .gitkeep
+        relative = path.lstrip("/")
+        if any(part.startswith(".") for part in relative.split("/")):
+            return None
+
+        try:
+            file_path = (self.directory / relative).resolve()
+        except (ValueError, OSError):
+            return None
+
+        if self.directory not in file_path.parents:
+            return None
+        return file_path
+
+    @staticmethod
+    def _not_modified(if_none_match: Optional[bytes], etag: str) -> bool:
+        if not if_none_match:
+            return False
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.decode().split(",")]
+        return "*" in candidates or etag in candidates
+
+    @staticmethod
+    def _parse_range(value: str, size: int) -> Optional[tuple[int, int]]:
+        # 只處理單一 bytes 區段；其他單位或多區段請求依 RFC 7233 可直接回傳完整內容
+        value = value.strip()
+        if not value.startswith("bytes=") or "," in value:
+            return 0, size
+
+        match = RANGE_PATTERN.match(value)
+        if match is None:
+            return None
+
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last) + 1, size) if last else size
+        elif last:
+            start, end = max(size - int(last), 0), size
+        else:
+            return None
+
+        if start >= size or start >= end:
+            return None
+        return start, end
+
+    async def _send_file(self, scope, send, file_path: Path, name: str, start: int, length: int, size: int, immutable: bool):
+        extensions = scope.get("extensions") or {}
+
+        if "http.response.pathsend" in extensions and start == 0 and length == size:
+            await send({"type": "http.response.pathsend", "path": str(file_path)})
+            return
+
+        if "http.response.zerocopysend" in extensions:
+            with open(file_path, "rb") as f:
+                await send({"type": "http.response.zerocopysend", "file": f, "offset": start, "count": length})
+            return
+
+        cacheable = self.cache is not None and immutable and size <= self.cache.max_file_size
+
+        async with await anyio.open_file(file_path, "rb") as f:
+            if cacheable:
+                content = await f.read()
+                self.cache.put(name, content)
+                await send({"type": "http.response.body", "body": content[start:start + length]})
+                return
+
+            await f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+        await send({"type": "http.response.body", "body": b""})
+
+    @staticmethod
+    async def _send_empty(send, status: int, headers: Optional[list] = None):
+        await send({"type": "http.response.start", "status": status, "headers": headers or []})
+        await send({"type": "http.response.body", "body": b""})
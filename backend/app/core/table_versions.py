@@ -0,0 +1,53 @@
+from itertools import chain
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from .database import upsert_insert
+from ..models.table_version import TableVersion
+
+# 受追蹤的資料表名稱，同時作為 table_versions.name
+_tracked: set[str] = set()
+
+
+def track_table_version(model) -> None:
+    _tracked.add(model.__tablename__)
+
+
+def _bump_statement(name: str):
+    table = TableVersion.__table__
+    statement = upsert_insert(table).values(name=name, version=1)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.name],
+        set_={"version": table.c.version + 1}
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_after_flush(session, flush_context):
+    """ORM 物件的新增、修改、刪除；after_flush 時 new / dirty / deleted 仍是 flush 前的狀態"""
+    names = {
+        type(instance).__tablename__
+        for instance in chain(session.new, session.dirty, session.deleted)
+        if getattr(type(instance), "__tablename__", None) in _tracked
+        and (instance not in session.dirty or session.is_modified(instance))
+    }
+    for name in sorted(names):
+        session.connection().execute(_bump_statement(name))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _bump_on_bulk_statement(orm_execute_state):
+    """
+    session.execute(update(User)) 等批次敘述不經過 flush，在執行前於同一個交易中遞增
+    以目標資料表判斷，ORM 實體與 Core 的 Table 敘述（update(User.__table__)）都會計入
+    """
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+
+    name = getattr(orm_execute_state.statement.table, "name", None)
+    if name in _tracked:
+        orm_execute_state.session.connection().execute(_bump_statement(name))
+
+
+async def get_table_version(db, name: str) -> int:
+    """主鍵查詢單一列；尚未有任何變更時為 0"""
+    return await db.scalar(select(TableVersion.version).where(TableVersion.name == name)) or 0
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from contextlib import suppress
+from datetime import timedelta
+from typing import Optional
+from sqlalchemy import select
+from .config import settings
+from .database import create_async_session
+from .metrics import register_collector
+from .user_cache import user_cache
+from ..models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+class TokenVersionTable:
+    """
+    每個 worker 在記憶體中保存所有用戶的 (token_version, is_active)，讓 get_current_user 不必每次查資料庫
+    - 啟動時整表載入，之後每 refresh_interval 秒只讀取 updated_at 較新的列
+    - 增量查詢看不到被刪除的列，因此每 full_reload_interval 秒整表重建一次
+    - 本 worker 的管理員操作會立即寫入；其他 worker 最遲在下一次增量刷新時看到
+
+    為了節省記憶體，每位用戶只存一個整數：啟用時為 token_version，停用時為 -(token_version + 1)
+    """
+
+    # 交易可能在 updated_at 之後一段時間才提交，增量查詢往回多讀一段時間避免漏掉
+    LOOKBACK = timedelta(seconds=60)
+
+    def __init__(self, enabled: bool, refresh_interval: float, full_reload_interval: float):
+        self.enabled = enabled
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self._entries: dict[int, int] = {}
+        self._watermark = None
+        self._last_full_reload = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, user_id: int) -> Optional[tuple[int, bool]]:
+        """回傳 (token_version, is_active)；None 代表表中沒有此用戶，需要回資料庫確認"""
+        encoded = self._entries.get(user_id)
+        if encoded is None:
+            return None
+        return (encoded, True) if encoded >= 0 else (-encoded - 1, False)
+
+    def update(self, user_id: int, token_version: int, is_active: bool) -> None:
+        if self.enabled:
+            self._entries[user_id] = token_version if is_active else -token_version - 1
+
+    def remove(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    async def refresh(self, full: bool = False) -> int:
+        query = select(User.id, User.token_version, User.is_active, User.updated_at)
+        if not full and self._watermark is not None:
+            query = query.where(User.updated_at >= self._watermark - self.LOOKBACK)
+
+        db = create_async_session()
+        try:
+            rows = (await db.execute(query)).all()
+        finally:
+            await db.close()
+
+        previous_watermark = self._watermark
+        entries = {} if full else self._entries
+        for row in rows:
+            encoded = row.token_version if row.is_active else -row.token_version - 1
+            # 其他 worker 修改過的用戶，本機快取的快照也一併失效；回溯重讀且沒有變化的列則略過
+            is_new = previous_watermark is None or (row.updated_at is not None and row.updated_at > previous_watermark)
+            if not full and (is_new or entries.get(row.id) != encoded):
+                user_cache.discard(row.id)
+            entries[row.id] = encoded
+
+            if row.updated_at is not None and (self._watermark is None or row.updated_at > self._watermark):
+                self._watermark = row.updated_at
+
+        if full:
+            # 整表重建才看得到被刪除的用戶
+            for user_id in self._entries.keys() - entries.keys():
+                user_cache.discard(user_id)
+            self._entries = entries
+            self._last_full_reload = time.monotonic()
+
+        return len(rows)
+
+    async def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+
+        try:
+            await self.refresh(full=True)
+        except Exception:
+            # 載入失敗時仍可運作：表中沒有的用戶會回資料庫確認
+            logger.exception("載入 token 版本表失敗")
+
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                full = time.monotonic() - self._last_full_reload >= self.full_reload_interval
+                await self.refresh(full=full)
+            except Exception:
+                logger.exception("刷新 token 版本表失敗")
+
+    def collect(self):
+        return [
+            ("token_version_table_entries", "gauge", "記憶體中的 token 版本表筆數", [({}, len(self._entries))]),
+        ]
+
+
+token_versions = TokenVersionTable(
+    enabled=settings.AUTH_STATELESS,
+    refresh_interval=settings.AUTH_VERSION_REFRESH_SECONDS,
+    full_reload_interval=settings.AUTH_VERSION_FULL_RELOAD_SECONDS
+)
+register_collector(token_versions.collect)
@@ -0,0 +1,131 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+from sqlalchemy.orm import make_transient_to_detached
+from starlette.concurrency import run_in_threadpool
+from .config import settings
+from .rate_limit import create_shared_storage
+from ..models.user import User
+
+USER_COLUMNS = [column.key for column in User.__table__.columns]
+
+
+class UserCache:
+    """
+    已登入用戶的 LRU + TTL 快取（以 user id 為鍵，每個 worker 各自一份）
+    存放欄位快照而非 ORM 物件，每次取出都建立新的 detached User，避免請求之間共用可變狀態
+    會改變用戶狀態的路由必須呼叫 invalidate()
+
+    多個 worker 時，invalidate() 會在共用儲存（RATE_LIMIT_STORAGE_URI）寫入存活 TTL 秒的失效標記，
+    標記存在期間所有 worker 都略過此用戶的快取、也不寫入新快照，改查資料庫；
+    標記一定晚於任何舊快照建立，且存活時間不短於快照，因此停用、刪除與重置密碼在所有 worker 立即生效
+    共用儲存是同步的檔案或網路 I/O，存取一律交給執行緒池，不阻塞事件迴圈
+    """
+
+    MARKER_PREFIX = "user_cache:invalidated"
+
+    def __init__(self, max_size: int, ttl_seconds: float, shared_storage=None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.shared_storage = shared_storage
+        self._entries: OrderedDict[int, tuple[float, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl_seconds > 0
+
+    async def get(self, user_id: int) -> Optional[User]:
+        if not self.enabled:
+            return None
+
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, snapshot = entry
+        if expires_at < time.monotonic():
+            self._entries.pop(user_id, None)
+            self.misses += 1
+            return None
+
+        if await self._invalidated_elsewhere(user_id):
+            self._entries.pop(user_id, None)
+            self.misses += 1
+            return None
+
+        # 等待共用儲存期間項目可能已被淘汰或失效
+        if user_id in self._entries:
+            self._entries.move_to_end(user_id)
+        self.hits += 1
+
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return user
+
+    async def set(self, user: User) -> None:
+        if not self.enabled:
+            return
+
+        snapshot = {key: getattr(user, key) for key in USER_COLUMNS}
+        if await self._invalidated_elsewhere(user.id):
+            return
+
+        self._entries[user.id] = (time.monotonic() + self.ttl_seconds, snapshot)
+        self._entries.move_to_end(user.id)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, user_id: int) -> None:
+        await self.invalidate_many([user_id])
+
+    async def invalidate_many(self, user_ids: Iterable[int]) -> None:
+        """清除本 worker 的快照，並通知其他 worker；批次操作以一次執行緒池呼叫寫入所有標記"""
+        user_ids = list(user_ids)
+        for user_id in user_ids:
+            self._entries.pop(user_id, None)
+        if user_ids and self.enabled and self.shared_storage is not None:
+            await run_in_threadpool(self._mark_invalidated, user_ids)
+
+    def discard(self, user_id: int) -> None:
+        """只清除本 worker 的快照，用於回應其他 worker 已經廣播過的變更"""
+        self._entries.pop(user_id, None)
+
+    def _marker_key(self, user_id: int) -> str:
+        return f"{self.MARKER_PREFIX}:{user_id}"
+
+    def _mark_invalidated(self, user_ids: list[int]) -> None:
+        # limits 的 incr 只在建立鍵時設定過期時間，再次失效時先清除，讓標記從這次起重新存活 TTL 秒
+        expiry = math.ceil(self.ttl_seconds)
+        for user_id in user_ids:
+            key = self._marker_key(user_id)
+            self.shared_storage.clear(key)
+            self.shared_storage.incr(key, expiry)
+
+    async def _invalidated_elsewhere(self, user_id: int) -> bool:
+        if self.shared_storage is None:
+            return False
+        return await run_in_threadpool(self.shared_storage.get, self._marker_key(user_id)) > 0
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def _create_user_cache() -> UserCache:
+    shared_storage = create_shared_storage()
+    ttl_seconds = settings.USER_CACHE_TTL_SECONDS
+    # 多個 worker 卻沒有共用儲存時無法通知其他 worker 失效，停用快取以確保停用與撤銷立即生效
+    if shared_storage is None and settings.WEB_CONCURRENCY > 1:
+        ttl_seconds = 0
+    return UserCache(
+        max_size=settings.USER_CACHE_MAX_SIZE,
+        ttl_seconds=ttl_seconds,
+        shared_storage=shared_storage
+    )
+
+
+user_cache = _create_user_cache()
@@ -1,24 +1,73 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from starlette.middleware.base import BaseHTTPMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from pathlib import Path
+from contextlib import asynccontextmanager, suppress
+import asyncio
 
 from .core.config import settings
-from .core.database import engine, Base
+from .core.database import init_engines, warm_up_pool, dispose_engines
+from .core.security import password_hasher
+from .core.audit import audit_buffer
+from .core.token_versions import token_versions
+from .core.login_guard import login_guard
+from .core.retention import run_retention_job
+from .core.file_utils import image_processor
+from .core.static_files import UploadFiles
+from .core.rate_limit import limiter
+from .core.serialization import DefaultJSONResponse
+from .core.query_stats import QueryStatsMiddleware
+from .core.compression import CompressionMiddleware
+from .core.metrics import (
+    MetricsMiddleware, render_metrics, parse_networks, address_allowed, CONTENT_TYPE as METRICS_CONTENT_TYPE
+)
 from .api.routes import auth, users, admin
-from .models.user import User
-from .models.audit_log import AuditLog
 
-Base.metadata.create_all(bind=engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 資料表由 python -m app.cli init-db 建立；這裡只建立引擎並預熱連線池
+    init_engines()
+    await warm_up_pool()
+
+    # 預先啟動 bcrypt 子行程，關閉時等待進行中的雜湊完成
+    await password_hasher.warm_up()
+    await audit_buffer.start()
+    # AUTH_STATELESS 開啟時載入 token 版本表並定期增量刷新
+    await token_versions.start()
+    await login_guard.start()
+
+    retention_task = None
+    if settings.AUDIT_RETENTION_DAYS > 0 and settings.AUDIT_RETENTION_INTERVAL_HOURS > 0:
+        retention_task = asyncio.create_task(run_retention_job(settings.AUDIT_RETENTION_INTERVAL_HOURS))
+
+    yield
+
+    if retention_task is not None:
+        retention_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await retention_task
+
+    await token_versions.stop()
+    # 先把登入拒絕彙總放進審計佇列，再由 audit_buffer 一併寫入
+    await login_guard.stop()
+
+    # 關閉前寫入尚未落地的審計日誌
+    await audit_buffer.stop()
+    # 等待子行程結束會阻塞，放到執行緒中進行，其他關閉工作仍可在事件迴圈上完成
+    await asyncio.to_thread(password_hasher.shutdown)
+    await asyncio.to_thread(image_processor.shutdown)
+    await dispose_engines()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="EvoSystem API",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=DefaultJSONResponse,
+    lifespan=lifespan
 )
 
 # 靜態文件服務（用於頭像等上傳檔案）
@@ -26,42 +75,64 @@ app = FastAPI(
 # 這樣前端拼接 URL 時：/api + /uploads/xxx 就會正確指向這裡
 UPLOAD_DIR = Path(__file__).parent.parent / "uploads"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-app.mount(f"{settings.API_V1_PREFIX}/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
+# 頭像檔名為內容雜湊或 UUID，永不重複使用，可以長期快取
+app.mount(
+    f"{settings.API_V1_PREFIX}/uploads",
+    UploadFiles(
+        directory=UPLOAD_DIR,
+        cache_max_bytes=settings.UPLOAD_CACHE_MAX_BYTES,
+        cache_max_file_size=settings.UPLOAD_CACHE_MAX_FILE_SIZE
+    ),
+    name="uploads"
+)
 
-limiter = Limiter(key_func=get_remote_address)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 
 # ==================== 安全 Headers 中介軟體 ====================
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+class SecurityHeadersMiddleware:
     """
     添加安全相關的 HTTP Headers
     保護網站免受 XSS、點擊劫持等攻擊
-    """
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
 
+    純 ASGI 實作：只在 http.response.start 附加預先編碼好的 header，
+    不像 BaseHTTPMiddleware 需要額外的 task 與記憶體串流，串流回應也不會被緩衝
+    """
+    HEADERS = [
         # 防止瀏覽器猜測檔案類型 (MIME sniffing)
-        response.headers["X-Content-Type-Options"] = "nosniff"
-
+        (b"x-content-type-options", b"nosniff"),
         # 禁止被嵌入 iframe，防止點擊劫持 (Clickjacking)
-        response.headers["X-Frame-Options"] = "DENY"
-
+        (b"x-frame-options", b"DENY"),
         # 開啟 XSS 防護過濾器 (針對舊版瀏覽器)
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-
+        (b"x-xss-protection", b"1; mode=block"),
         # 限制 Referrer 資訊的傳送，保護隱私
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-
+        (b"referrer-policy", b"strict-origin-when-cross-origin"),
         # 禁用不需要的瀏覽器功能 (如地理位置、麥克風)
-        response.headers["Permissions-Policy"] = (
-            "geolocation=(), "
-            "microphone=(), "
-            "camera=()"
-        )
+        (b"permissions-policy", b"geolocation=(), microphone=(), camera=()"),
+    ]
+    HEADER_NAMES = frozenset(name for name, _ in HEADERS)
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                # 與原本的 response.headers[...] = ... 相同：覆寫而非重複
+                headers = [
+                    header for header in message.get("headers", [])
+                    if header[0].lower() not in self.HEADER_NAMES
+                ]
+                headers.extend(self.HEADERS)
+                message["headers"] = headers
+            await send(message)
 
-        return response
+        await self.app(scope, receive, send_with_headers)
 
 
 # ==================== CORS 配置 ====================
@@ -71,10 +142,30 @@ app.add_middleware(
     allow_credentials=True,                        # 允許跨域請求攜帶 Cookie (JWT 需要)
     allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     allow_headers=["Content-Type", "Authorization"],
+    expose_headers=["X-Next-Cursor"],              # 允許前端讀取分頁游標
+    max_age=settings.CORS_MAX_AGE,                 # 快取預檢結果，避免每次請求前都送 OPTIONS
 )
 
 app.add_middleware(SecurityHeadersMiddleware)
 
+if settings.SQL_TIMING_ENABLED:
+    app.add_middleware(QueryStatsMiddleware)
+
+# 頭像等上傳檔案已是壓縮格式，且由 UploadFiles 自行處理快取
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+        zstd_level=settings.COMPRESSION_ZSTD_LEVEL,
+        exclude_paths=(f"{settings.API_V1_PREFIX}/uploads",)
+    )
+
+# 最後加入的中介軟體位於最外層，量測時間包含其他中介軟體
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 app.include_router(auth.router, prefix=settings.API_V1_PREFIX, tags=["認證"])
 app.include_router(users.router, prefix=settings.API_V1_PREFIX, tags=["用戶"])
 app.include_router(admin.router, prefix=f"{settings.API_V1_PREFIX}/admin", tags=["管理員"])
@@ -92,3 +183,14 @@ def read_root():
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
+
+
+if settings.METRICS_ENABLED:
+    metrics_networks = parse_networks(settings.METRICS_ALLOWED_NETWORKS)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics(request: Request):
+        # 不在允許網段內的來源視同端點不存在
+        if request.client is None or not address_allowed(request.client.host, metrics_networks):
+            raise HTTPException(status_code=404, detail="Not Found")
+        return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
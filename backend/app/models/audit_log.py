@@ -1,18 +1,25 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index
 from sqlalchemy.sql import func
 from ..core.database import Base
 
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    # keyset 分頁依 (created_at, id) 倒序；action 篩選使用 (action, created_at, id)
+    __table_args__ = (
+        Index("ix_audit_logs_created_at_id", "created_at", "id"),
+        Index("ix_audit_logs_action_created_at_id", "action", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
-    action = Column(String, nullable=False, index=True)
+    # 寫入時冗餘保存用戶名，查詢列表時不需要再 JOIN users
+    username = Column(String, nullable=True)
+    action = Column(String, nullable=False)
     ip_address = Column(String, nullable=True)
     user_agent = Column(Text, nullable=True)
     details = Column(Text, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     def __repr__(self):
         return f"<AuditLog(id={self.id}, user_id={self.user_id}, action='{self.action}')>"
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, DateTime, Date, Index
+from ..core.database import Base
+
+
+class AuditLogHourlyRollup(Base):
+    """每個 action 每小時（UTC）的事件數"""
+    __tablename__ = "audit_log_hourly_rollups"
+    # 主鍵 (action, bucket) 供單一 action 的時間範圍查詢；不限 action 時使用 bucket 索引
+    __table_args__ = (
+        Index("ix_audit_log_hourly_rollups_bucket", "bucket"),
+    )
+
+    action = Column(String, primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class AuditLogIpDailyRollup(Base):
+    """每個 IP 每天（UTC）各 action 的事件數；沒有 IP 的事件以空字串記錄"""
+    __tablename__ = "audit_log_ip_daily_rollups"
+    # 「今天登入失敗最多的 IP」依 (day, action) 篩選後以 count 排序
+    __table_args__ = (
+        Index("ix_audit_log_ip_daily_rollups_day_action_count", "day", "action", "count"),
+    )
+
+    ip_address = Column(String, primary_key=True)
+    action = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class AuditLogActionTotal(Base):
+    """每個 action 的總筆數，與 audit_logs 同一交易更新，可直接作為列表的精確 total"""
+    __tablename__ = "audit_log_action_totals"
+
+    action = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
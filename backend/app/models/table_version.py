@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, String
+from ..core.database import Base
+
+
+class TableVersion(Base):
+    """每張受追蹤資料表的變更版本，任何新增、修改、刪除都在同一個交易中遞增（見 core/table_versions.py）"""
+    __tablename__ = "table_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
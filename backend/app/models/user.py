@@ -1,10 +1,19 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Index
 from sqlalchemy.sql import func
 from ..core.database import Base
 
 
 class User(Base):
     __tablename__ = "users"
+    # 管理員列表依 (created_at, id) 做 keyset 分頁，role / is_active 篩選各自有對應的複合索引
+    # updated_at 索引供 token 版本表的增量刷新使用
+    __table_args__ = (
+        Index("ix_users_created_at_id", "created_at", "id"),
+        Index("ix_users_role_created_at_id", "role", "created_at", "id"),
+        Index("ix_users_is_active_created_at_id", "is_active", "created_at", "id"),
+        Index("ix_users_updated_at", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True, nullable=False)
@@ -14,5 +23,13 @@ class User(Base):
     bio = Column(Text, nullable=True)
     role = Column(String, default="user", nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # 寫入 JWT 的版本號；停用、重置密碼時遞增，舊的 token 立即失效
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
+    # 由 Python 產生到微秒：SQLite 的 CURRENT_TIMESTAMP 只到秒，且字串格式與綁定的游標值不同，
+    # 同一秒建立的用戶會在 keyset 分頁時被略過；server_default 只留給不經 SQLAlchemy 的 INSERT
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now()
+    )
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
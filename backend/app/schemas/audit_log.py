@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, TypeAdapter
+from datetime import date, datetime
 from typing import Optional, List
 
 
@@ -18,8 +18,39 @@ class AuditLogResponse(BaseModel):
 
 
 class AuditLogListResponse(BaseModel):
-    total: int
+    # 游標模式不計算總數（total / total_pages 為 null），以 next_cursor 是否為 null 判斷是否還有下一頁
+    total: Optional[int] = None
     page: int
     page_size: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
     logs: List[AuditLogResponse]
+
+
+AuditLogListAdapter = TypeAdapter(List[AuditLogResponse])
+
+
+class AuditActionCount(BaseModel):
+    action: str
+    count: int
+
+
+class AuditHourlyCount(BaseModel):
+    bucket: datetime
+    action: str
+    count: int
+
+
+class AuditIpCount(BaseModel):
+    ip_address: Optional[str] = None
+    action: str
+    count: int
+
+
+class AuditStatsResponse(BaseModel):
+    total: int
+    totals: List[AuditActionCount]
+    since: datetime
+    hourly: List[AuditHourlyCount]
+    day: date
+    top_ips: List[AuditIpCount]
@@ -1,7 +1,8 @@
-from pydantic import BaseModel, EmailStr, field_validator
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter, field_validator, computed_field
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Dict, List
 from ..core.validators import PasswordValidator, UsernameValidator
+from ..core.file_utils import AvatarManager
 
 
 class UserBase(BaseModel):
@@ -74,10 +75,42 @@ class UserResponse(UserBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
 
+    @computed_field
+    @property
+    def avatar_thumbnails(self) -> Optional[Dict[str, str]]:
+        return AvatarManager.derivative_paths(self.avatar)
+
     class Config:
         from_attributes = True
 
 
+# 預先建立的列表 TypeAdapter，避免每個請求重新建構驗證器
+UserListAdapter = TypeAdapter(List[UserResponse])
+
+
+# 欄位與順序直接取自 UserResponse，新增或調整欄位時列表投影與 user_row_to_dict 會一起改變
+USER_RESPONSE_FIELDS = tuple(UserResponse.model_fields)
+
+# computed_field 需要模型實例才能計算，這裡提供從投影列計算的對應方式
+USER_RESPONSE_COMPUTED = {
+    "avatar_thumbnails": lambda row: AvatarManager.derivative_paths(row.avatar),
+}
+
+if set(USER_RESPONSE_COMPUTED) != set(UserResponse.__pydantic_decorators__.computed_fields):
+    raise RuntimeError("USER_RESPONSE_COMPUTED 必須與 UserResponse 的 computed_field 一致")
+
+
+def user_row_to_dict(row) -> dict:
+    """
+    投影查詢的列直接轉成與 UserResponse 相同結構（含欄位順序與 avatar_thumbnails）的 dict
+    管理員列表最多 1000 筆，略過建立 pydantic 模型可省下大部分序列化時間
+    """
+    data = {name: getattr(row, name) for name in USER_RESPONSE_FIELDS}
+    for name, compute in USER_RESPONSE_COMPUTED.items():
+        data[name] = compute(row)
+    return data
+
+
 class AdminPasswordReset(BaseModel):
     new_password: str
 
@@ -85,3 +118,40 @@ class AdminPasswordReset(BaseModel):
     @classmethod
     def validate_password(cls, v):
         return PasswordValidator.validate(v)
+
+
+class BulkUserIds(BaseModel):
+    user_ids: List[int] = Field(..., min_length=1, max_length=1000)
+
+    @field_validator('user_ids')
+    @classmethod
+    def deduplicate(cls, v):
+        # 保留原本順序去除重複 id，結果報告與請求順序一致
+        return list(dict.fromkeys(v))
+
+
+class BulkActiveUpdate(BulkUserIds):
+    is_active: bool
+
+
+class BulkPasswordReset(BulkUserIds):
+    # 每個帳號都要各自計算 bcrypt，數量上限比其他批次操作小
+    user_ids: List[int] = Field(..., min_length=1, max_length=100)
+    new_password: str
+
+    @field_validator('new_password')
+    @classmethod
+    def validate_password(cls, v):
+        return PasswordValidator.validate(v)
+
+
+class BulkResultItem(BaseModel):
+    user_id: int
+    status: str
+    detail: Optional[str] = None
+
+
+class BulkOperationResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BulkResultItem]
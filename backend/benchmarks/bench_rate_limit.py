@@ -0,0 +1,81 @@
+"""
+限流儲存後端的每次請求額外開銷與跨行程正確性
+執行: python -m benchmarks.bench_rate_limit [--storage memory:// sqlite:////tmp/rl.db redis://localhost:6379]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./benchmark.db")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+from app.core import rate_limit  # noqa: F401  註冊 sqlite:// 儲存後端
+
+
+def measure_overhead(storage_uri: str, iterations: int, keys: int) -> dict:
+    limiter = FixedWindowRateLimiter(storage_from_string(storage_uri))
+    item = parse("5/minute")
+    samples = []
+
+    for i in range(iterations):
+        start = time.perf_counter()
+        limiter.hit(item, "bench", str(i % keys))
+        samples.append((time.perf_counter() - start) * 1_000_000)
+
+    samples.sort()
+    return {
+        "storage": storage_uri,
+        "iterations": iterations,
+        "mean_us": statistics.fmean(samples),
+        "p50_us": samples[len(samples) // 2],
+        "p99_us": samples[int(len(samples) * 0.99)],
+    }
+
+
+def _worker(storage_uri: str, attempts: int, results) -> None:
+    limiter = FixedWindowRateLimiter(storage_from_string(storage_uri))
+    item = parse("5/minute")
+    results.put(sum(limiter.hit(item, "bench", "shared") for _ in range(attempts)))
+
+
+def check_shared(storage_uri: str, workers: int, attempts: int) -> dict:
+    """模擬多個 uvicorn worker 對同一個 IP 限流，共用儲存時總放行次數應等於限制值"""
+    storage_from_string(storage_uri).reset()
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    processes = [ctx.Process(target=_worker, args=(storage_uri, attempts, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    allowed = sum(results.get() for _ in processes)
+    return {"storage": storage_uri, "workers": workers, "limit": 5, "allowed": allowed}
+
+
+def main() -> None:
+    default_sqlite = f"sqlite:///{os.path.join(tempfile.gettempdir(), 'evosystem_ratelimit_bench.db')}"
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--storage", nargs="+", default=["memory://", default_sqlite])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    report = {
+        "overhead": [measure_overhead(uri, args.iterations, args.keys) for uri in args.storage],
+        "shared": [check_shared(uri, args.workers, 10) for uri in args.storage],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
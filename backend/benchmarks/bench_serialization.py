@@ -0,0 +1,161 @@
+"""
+序列化微基準：比較管理員列表回應的三種編碼方式
+- models: 逐筆 model_validate 後交給 FastAPI 的 jsonable_encoder + json.dumps（原本的路徑）
+- adapter: 預先建立的 TypeAdapter(List[...]) 以 from_attributes 驗證後 dump_json
+- direct: 投影的列直接轉 dict，以 serialization.dumps 編碼（目前的路徑）
+
+三種方式的輸出會先解析比對，確保結構完全相同，再輸出每次編碼的平均時間（毫秒）JSON
+
+執行: python -m benchmarks.bench_serialization [--rows 1000] [--iterations 200]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000, help="每次編碼的列數（管理員列表上限為 1000）")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5, help="取最佳一輪")
+    return parser.parse_args()
+
+
+def load_rows(rows: int):
+    """在暫存 SQLite 中建立資料並以與 API 相同的投影查詢讀回，取得真正的 Row 物件"""
+    from sqlalchemy import insert, select
+    from app.core.database import init_engines, create_session
+    from app.core.schema import bootstrap_schema
+    from app.models.user import User
+    from app.models.audit_log import AuditLog
+    from app.api.routes.admin import USER_LIST_COLUMNS
+
+    engine = init_engines()
+    bootstrap_schema(engine)
+    now = datetime.now(timezone.utc)
+
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {
+                "id": i,
+                "username": f"user{i}",
+                "email": f"user{i}@bench-evosystem.com",
+                "hashed_password": "x",
+                "bio": f"bio {i}" if i % 2 else None,
+                "avatar": f"/uploads/avatars/{i:032x}.webp" if i % 3 else None,
+                "role": "user",
+                "is_active": True,
+                "created_at": now - timedelta(seconds=i),
+                "updated_at": now - timedelta(seconds=i),
+            }
+            for i in range(1, rows + 1)
+        ])
+        connection.execute(insert(AuditLog), [
+            {
+                "user_id": i,
+                "username": f"user{i}",
+                "action": "login_success",
+                "ip_address": "10.0.0.1",
+                "user_agent": "bench",
+                "details": None,
+                "created_at": now - timedelta(seconds=i),
+            }
+            for i in range(1, rows + 1)
+        ])
+
+    audit_columns = (
+        AuditLog.id, AuditLog.user_id, AuditLog.username, AuditLog.action,
+        AuditLog.ip_address, AuditLog.user_agent, AuditLog.details, AuditLog.created_at
+    )
+    with create_session() as db:
+        users = db.execute(select(*USER_LIST_COLUMNS).order_by(User.id)).all()
+        logs = db.execute(select(*audit_columns).order_by(AuditLog.id)).all()
+    return users, logs
+
+
+def build_cases(users, logs) -> dict:
+    from fastapi.encoders import jsonable_encoder
+    from app.core.serialization import dumps
+    from app.schemas.user import UserResponse, UserListAdapter, user_row_to_dict
+    from app.schemas.audit_log import AuditLogResponse, AuditLogListAdapter
+
+    def models(model, rows):
+        return lambda: json.dumps(
+            jsonable_encoder([model.model_validate(row, from_attributes=True) for row in rows]),
+            ensure_ascii=False, separators=(",", ":")
+        ).encode()
+
+    def adapter(type_adapter, rows):
+        return lambda: type_adapter.dump_json(type_adapter.validate_python(rows, from_attributes=True))
+
+    return {
+        "users": {
+            "models": models(UserResponse, users),
+            "adapter": adapter(UserListAdapter, users),
+            "direct": lambda: dumps([user_row_to_dict(row) for row in users]),
+        },
+        "audit_logs": {
+            "models": models(AuditLogResponse, logs),
+            "adapter": adapter(AuditLogListAdapter, logs),
+            "direct": lambda: dumps([row._asdict() for row in logs]),
+        },
+    }
+
+
+def main():
+    args = parse_args()
+    tmp_dir = Path(tempfile.mkdtemp(prefix="evosystem-bench-"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir / 'bench.db'}"
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+
+    try:
+        users, logs = load_rows(args.rows)
+        cases = build_cases(users, logs)
+
+        results = {}
+        for dataset, variants in cases.items():
+            outputs = {name: json.loads(encode()) for name, encode in variants.items()}
+            reference = outputs["models"]
+            for name, output in outputs.items():
+                if output != reference:
+                    sys.exit(f"{dataset}/{name} 的輸出與 models 不一致")
+
+            results[dataset] = {}
+            for name, encode in variants.items():
+                best = min(timeit.repeat(encode, number=args.iterations, repeat=args.repeat))
+                results[dataset][name] = round(best / args.iterations * 1000, 3)
+            baseline = results[dataset]["models"]
+            print(
+                f"{dataset:<12} " + "  ".join(
+                    f"{name} {ms} ms (x{baseline / ms:.1f})" for name, ms in results[dataset].items()
+                ),
+                file=sys.stderr
+            )
+    finally:
+        from app.core.database import dispose_engines
+        asyncio.run(dispose_engines())
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    from app.core.serialization import orjson
+
+    print(json.dumps({
+        "python": platform.python_version(),
+        "orjson": orjson is not None,
+        "rows": args.rows,
+        "iterations": args.iterations,
+        "mean_ms": results,
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
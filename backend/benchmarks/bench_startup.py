@@ -0,0 +1,81 @@
+"""
+啟動時間：匯入 app.main 的耗時，以及 uvicorn 啟動到第一個請求成功回應的耗時
+執行: python -m benchmarks.bench_startup [--runs 5]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+ENV = {
+    **os.environ,
+    "DATABASE_URL": os.environ.get("DATABASE_URL", "sqlite:///./benchmark.db"),
+    "SECRET_KEY": os.environ.get("SECRET_KEY", "benchmark-secret-key"),
+}
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+
+
+def measure_import() -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=BACKEND_DIR, env=ENV, capture_output=True, text=True, check=True
+    )
+    return float(output.stdout.strip().splitlines()[-1]) * 1000
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_request(timeout: float) -> float:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=ENV
+    )
+
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"{timeout} 秒內沒有收到 {url} 的回應")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    import_ms = [measure_import() for _ in range(args.runs)]
+    first_request_ms = [measure_first_request(args.timeout) for _ in range(args.runs)]
+
+    print(json.dumps({
+        "runs": args.runs,
+        "import_ms": {"median": statistics.median(import_ms), "min": min(import_ms)},
+        "first_request_ms": {"median": statistics.median(first_request_ms), "min": min(first_request_ms)},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,54 @@
 """
 後端啟動腳本
-執行: python run.py
+開發: python run.py
+生產: python run.py --prod [--workers 4]（或設定 SERVER_MODE=production）
 """
+import argparse
+import os
 import uvicorn
 
-if __name__ == "__main__":
+from app.core.config import settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="啟動 EvoSystem 後端")
+    parser.add_argument("--prod", action="store_true", default=settings.SERVER_MODE == "production",
+                        help="生產模式：多 worker、uvloop + httptools、不自動重新載入")
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS,
+                        help="worker 數量，0 表示使用 CPU 核心數")
+    args = parser.parse_args()
+
+    if not args.prod:
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            reload=True
+        )
+        return
+
+    workers = args.workers or os.cpu_count() or 1
+
+    # 讓每個 worker 依總數分配資料庫連線池（見 app/core/database.py）
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+
     uvicorn.run(
         "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEPALIVE,
+        # 收到 SIGTERM 後停止接受新連線，等待進行中的請求完成，再執行 lifespan 關閉流程
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT,
+        access_log=settings.SERVER_ACCESS_LOG,
+        proxy_headers=True
     )
+
+
+if __name__ == "__main__":
+    main()
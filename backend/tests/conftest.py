@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import httpx
+import pytest
+
+# 設定在 app 模組載入時讀取，需在匯入任何 app 模組之前決定
+_TEST_DIR = Path(tempfile.mkdtemp(prefix="evosystem-tests-"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_TEST_DIR / 'test.db'}")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+# bcrypt 改用執行緒池，測試不建立子行程
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+os.environ.setdefault("AUDIT_LOG_FLUSH_INTERVAL_MS", "50")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture(scope="session")
+def database():
+    """建立測試資料庫的資料表，回傳同步引擎"""
+    from app.core.database import init_engines
+    from app.core.schema import bootstrap_schema
+
+    engine = init_engines()
+    bootstrap_schema(engine)
+    return engine
+
+
+@pytest.fixture
+def app(database):
+    """停用速率限制的應用程式"""
+    from app.core.rate_limit import limiter
+    from app.main import app
+
+    limiter.enabled = False
+    yield app
+    limiter.enabled = True
+
+
+def write_sync(*statements) -> None:
+    from app.core.database import create_session
+
+    with create_session() as db:
+        for statement in statements:
+            db.execute(statement)
+        db.commit()
+
+
+@pytest.fixture
+def admin_client(app):
+    """
+    回傳 async context manager：啟動 lifespan，註冊並以管理員身分登入，產出 httpx 用戶端
+    同步 Session 的寫入在執行緒中執行，避免阻塞事件迴圈上的審計日誌寫入而鎖住 SQLite
+    """
+    from sqlalchemy import update
+    from app.models.user import User
+
+    @asynccontextmanager
+    async def start(name: str, password: str = "abcd1234"):
+        email = f"{name}@example.com"
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                await client.post("/api/register", json={"username": name, "email": email, "password": password})
+                await asyncio.to_thread(
+                    write_sync, update(User).where(User.email == email).values(role="admin")
+                )
+                response = await client.post("/api/login", json={"email": email, "password": password})
+                assert response.status_code == 200, response.text
+                yield client
+
+    return start
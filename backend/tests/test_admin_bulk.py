@@ -0,0 +1,154 @@
+import asyncio
+
+import httpx
+import pytest
+from sqlalchemy import delete, insert, select
+
+from app.api.routes import admin as admin_routes
+from app.core.database import create_session
+from app.models.user import User
+
+STEM = "fedcba9876543210fedcba9876543210"
+
+
+def create_users(prefix: str, count: int, **values) -> list[int]:
+    with create_session() as db:
+        ids = [
+            db.execute(insert(User).values(
+                username=f"{prefix}{i}", email=f"{prefix}{i}@example.com", hashed_password="x", **values
+            ).returning(User.id)).scalar_one()
+            for i in range(count)
+        ]
+        db.commit()
+    return ids
+
+
+def user_states(ids: list[int]) -> dict:
+    with create_session() as db:
+        rows = db.execute(select(User.id, User.is_active, User.token_version).where(User.id.in_(ids)))
+        return {row.id: (row.is_active, row.token_version) for row in rows}
+
+
+def statuses(response: httpx.Response) -> list:
+    return [(item["user_id"], item["status"]) for item in response.json()["results"]]
+
+
+async def admin_id(client) -> int:
+    return (await client.get("/api/me")).json()["id"]
+
+
+def test_bulk_deactivate_reports_each_id_and_revokes_tokens(app, admin_client):
+    async def scenario():
+        async with admin_client("bulkactive") as admin:
+            me = await admin_id(admin)
+            users = await asyncio.to_thread(create_users, "bulkactive", 2)
+            before = await asyncio.to_thread(user_states, users)
+            response = await admin.patch("/api/admin/users/bulk/active", json={
+                "user_ids": [users[0], users[1], me, 999999, users[0]], "is_active": False
+            })
+            deactivated = await asyncio.to_thread(user_states, users)
+            await admin.patch("/api/admin/users/bulk/active", json={"user_ids": users, "is_active": True})
+            return me, users, before, response, deactivated, await asyncio.to_thread(user_states, users)
+
+    me, users, before, response, deactivated, reactivated = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    assert response.json()["succeeded"] == 2 and response.json()["failed"] == 2
+    assert statuses(response) == [(users[0], "ok"), (users[1], "ok"), (me, "forbidden"), (999999, "not_found")]
+    for user_id in users:
+        assert deactivated[user_id] == (False, before[user_id][1] + 1)
+        # 重新啟用不遞增版本
+        assert reactivated[user_id] == (True, before[user_id][1] + 1)
+
+
+def test_bulk_reset_password_revokes_tokens_and_reports_concurrent_deletes(app, admin_client, monkeypatch):
+    hash_password = admin_routes.get_password_hash_async
+    deleted = []
+
+    def delete_user(user_id):
+        with create_session() as db:
+            db.execute(delete(User).where(User.id == user_id))
+            db.commit()
+
+    async def hash_and_delete(password):
+        # 計算雜湊期間另一個請求刪除了其中一個用戶
+        if not deleted:
+            deleted.append(victim)
+            await asyncio.to_thread(delete_user, victim)
+        return await hash_password(password)
+
+    monkeypatch.setattr(admin_routes, "get_password_hash_async", hash_and_delete)
+    kept, victim = create_users("bulkreset", 2)
+
+    async def scenario():
+        async with admin_client("bulkreset") as admin:
+            user = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+            try:
+                await user.post("/api/register", json={
+                    "username": "bulkresetuser", "email": "bulkresetuser@example.com", "password": "abcd1234"
+                })
+                await user.post("/api/login", json={"email": "bulkresetuser@example.com", "password": "abcd1234"})
+                user_id = (await user.get("/api/me")).json()["id"]
+
+                response = await admin.patch("/api/admin/users/bulk/reset-password", json={
+                    "user_ids": [user_id, kept, victim], "new_password": "newpass123"
+                })
+                old_token = (await user.get("/api/me")).status_code
+                relogin = await user.post(
+                    "/api/login", json={"email": "bulkresetuser@example.com", "password": "newpass123"}
+                )
+                return user_id, response, old_token, relogin.status_code
+            finally:
+                await user.aclose()
+
+    user_id, response, old_token, relogin = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    assert statuses(response) == [(user_id, "ok"), (kept, "ok"), (victim, "not_found")]
+    assert old_token == 401
+    assert relogin == 200
+
+
+def test_bulk_delete_removes_avatars_only_when_unreferenced(app, admin_client, monkeypatch, tmp_path):
+    avatars = tmp_path / "avatars"
+    avatars.mkdir()
+    monkeypatch.setattr(admin_routes, "UPLOAD_DIR", avatars)
+    shared = avatars / f"{STEM}.png"
+    shared.write_bytes(b"\x89PNG\r\n\x1a\n")
+    (avatars / f"{STEM}_64.webp").write_bytes(b"RIFF")
+    avatar_path = f"uploads/avatars/{STEM}.png"
+    first, second = create_users("bulkdelete", 2, avatar=avatar_path)
+
+    async def scenario():
+        async with admin_client("bulkdelete") as admin:
+            me = await admin_id(admin)
+            partial = await admin.post("/api/admin/users/bulk/delete", json={"user_ids": [first, me]})
+            still_shared = shared.exists()
+            complete = await admin.post("/api/admin/users/bulk/delete", json={"user_ids": [second, first]})
+            return me, partial, still_shared, complete
+
+    me, partial, still_shared, complete = asyncio.run(scenario())
+
+    assert statuses(partial) == [(first, "ok"), (me, "forbidden")]
+    assert still_shared
+    assert statuses(complete) == [(second, "ok"), (first, "not_found")]
+    # 最後一個引用者刪除後，原圖與縮圖在背景任務中移除
+    assert list(avatars.iterdir()) == []
+    assert user_states([first, second]) == {}
+
+
+@pytest.mark.parametrize(
+    ("endpoint", "method", "payload"),
+    [
+        ("/api/admin/users/bulk/active", "PATCH", {"user_ids": [], "is_active": False}),
+        ("/api/admin/users/bulk/delete", "POST", {"user_ids": list(range(1, 1002))}),
+        ("/api/admin/users/bulk/reset-password", "PATCH", {"user_ids": list(range(1, 102)), "new_password": "newpass123"}),
+        ("/api/admin/users/bulk/reset-password", "PATCH", {"user_ids": [1], "new_password": "short"}),
+    ],
+)
+def test_bulk_payload_limits(admin_client, endpoint, method, payload):
+    async def scenario():
+        async with admin_client("bulklimits") as admin:
+            return (await admin.request(method, endpoint, json=payload)).status_code
+
+    assert asyncio.run(scenario()) == 422
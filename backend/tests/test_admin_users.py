@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import insert, text
+
+from app.core.database import create_session
+from app.core.schema import normalize_sqlite_timestamps
+from app.models.user import User
+
+PAGE_SIZE = 2
+
+
+def insert_users(prefix: str, count: int, created_at=None) -> list[int]:
+    with create_session() as db:
+        ids = []
+        for i in range(count):
+            values = dict(
+                username=f"{prefix}{i}", email=f"{prefix}{i}@example.com", hashed_password="x", role=prefix
+            )
+            if created_at is not None:
+                values["created_at"] = created_at
+            ids.append(db.execute(insert(User).values(**values).returning(User.id)).scalar_one())
+        db.commit()
+    return ids
+
+
+def insert_legacy_users(prefix: str, count: int) -> list[int]:
+    # 模擬不經 SQLAlchemy 寫入、由 CURRENT_TIMESTAMP 產生只到秒的時間
+    with create_session() as db:
+        for i in range(count):
+            db.execute(text(
+                "INSERT INTO users (username, email, hashed_password, role, is_active, created_at) "
+                "VALUES (:name, :email, 'x', :role, 1, CURRENT_TIMESTAMP)"
+            ), {"name": f"{prefix}{i}", "email": f"{prefix}{i}@example.com", "role": prefix})
+        db.commit()
+        return list(db.execute(text("SELECT id FROM users WHERE role = :role ORDER BY id"), {"role": prefix}).scalars())
+
+
+async def collect_pages(client, role: str) -> list[list[int]]:
+    pages = []
+    params = {"role": role, "limit": PAGE_SIZE}
+    while True:
+        response = await client.get("/api/admin/users", params=params)
+        assert response.status_code == 200, response.text
+        pages.append([user["id"] for user in response.json()])
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            return pages
+        params = {"role": role, "limit": PAGE_SIZE, "cursor": cursor}
+
+
+@pytest.mark.parametrize(
+    ("prefix", "insert_rows"),
+    [
+        # 同一時間建立的用戶依 id 分頁
+        ("samesecond", lambda prefix: insert_users(prefix, 6, datetime(2024, 1, 1, tzinfo=timezone.utc))),
+        ("pydefault", lambda prefix: insert_users(prefix, 5)),
+        ("legacy", lambda prefix: insert_legacy_users(prefix, 6)),
+    ],
+)
+def test_keyset_pages_cover_every_user_once(admin_client, database, prefix, insert_rows):
+    ids = insert_rows(prefix)
+    normalize_sqlite_timestamps(database)
+
+    async def scenario():
+        async with admin_client(f"{prefix}admin") as client:
+            return await collect_pages(client, prefix)
+
+    pages = asyncio.run(scenario())
+
+    assert [user_id for page in pages for user_id in page] == sorted(ids)
+    assert all(len(page) <= PAGE_SIZE for page in pages)
+    assert len(pages) == -(-len(ids) // PAGE_SIZE)
+
+
+def test_normalize_sqlite_timestamps_pads_second_resolution_values(database):
+    insert_legacy_users("padded", 2)
+
+    assert normalize_sqlite_timestamps(database) >= 2
+    assert normalize_sqlite_timestamps(database) == 0
+    with create_session() as db:
+        stored = db.execute(text("SELECT created_at FROM users WHERE role = 'padded'")).scalars().all()
+    assert all(len(value) == 26 and value.endswith(".000000") for value in stored)
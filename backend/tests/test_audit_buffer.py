@@ -0,0 +1,73 @@
+import asyncio
+
+from app.core import audit
+from app.core.audit import AuditLogBuffer
+
+
+class UnreachableSession:
+    """資料庫無法連線時 execute、rollback、close 都會失敗"""
+
+    async def execute(self, *args, **kwargs):
+        raise OSError("connection refused")
+
+    async def rollback(self):
+        raise OSError("connection refused")
+
+    async def close(self):
+        raise OSError("connection refused")
+
+
+class RecordingSession:
+    def __init__(self, written: list):
+        self.written = written
+
+    async def execute(self, statement, *args, **kwargs):
+        self.written.append(statement)
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+def test_writer_keeps_running_when_rollback_and_close_fail(monkeypatch):
+    written = []
+    sessions = iter([UnreachableSession(), RecordingSession(written)])
+    monkeypatch.setattr(audit, "create_async_session", lambda: next(sessions))
+    buffer = AuditLogBuffer(max_queue_size=10, batch_size=10, flush_interval_ms=10)
+
+    async def scenario():
+        await buffer.start()
+        buffer.record(action="first")
+        while buffer.failed == 0:
+            await asyncio.sleep(0.01)
+
+        buffer.record(action="second")
+        while buffer.flushed == 0:
+            await asyncio.sleep(0.01)
+        running = not buffer._task.done()
+        await buffer.stop()
+        return running
+
+    assert asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+    assert buffer.failed == 1 and buffer.flushed == 1
+    assert len(written) == 1
+
+
+def test_buffer_can_restart_on_a_new_event_loop(monkeypatch):
+    written = []
+    monkeypatch.setattr(audit, "create_async_session", lambda: RecordingSession(written))
+    buffer = AuditLogBuffer(max_queue_size=10, batch_size=10, flush_interval_ms=10)
+
+    async def scenario():
+        await buffer.start()
+        buffer.record(action="login")
+        await buffer.stop()
+
+    asyncio.run(scenario())
+    asyncio.run(scenario())
+    assert buffer.flushed == 2
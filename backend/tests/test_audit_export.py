@@ -0,0 +1,79 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core.audit_export import EXPORT_FIELDS, rows_to_csv, rows_to_ndjson
+
+CREATED_AT = datetime(2024, 5, 1, 8, 30, tzinfo=timezone.utc)
+
+
+def make_row(**overrides) -> tuple:
+    values = dict(
+        id=1, user_id=7, username="alice", action="login", ip_address="10.0.0.1",
+        user_agent="Mozilla/5.0", details="登入成功", created_at=CREATED_AT,
+    )
+    values.update(overrides)
+    return tuple(values[field] for field in EXPORT_FIELDS)
+
+
+def parse_csv(data: bytes) -> list:
+    return list(csv.reader(io.StringIO(data.decode("utf-8-sig"))))
+
+
+def test_csv_header_has_bom_and_fields():
+    data = rows_to_csv([], include_header=True)
+    assert data.startswith("﻿".encode())
+    assert parse_csv(data) == [EXPORT_FIELDS]
+
+
+def test_csv_rows():
+    rows = parse_csv(rows_to_csv([make_row(), make_row(id=2, user_id=None, details='含有 "引號", 與逗號')]))
+
+    assert rows[0] == ["1", "7", "alice", "login", "10.0.0.1", "Mozilla/5.0", "登入成功", CREATED_AT.isoformat()]
+    assert rows[1][1] == "" and rows[1][6] == '含有 "引號", 與逗號'
+
+
+@pytest.mark.parametrize("payload", ["=HYPERLINK(\"http://x\")", "+1+1", "-2+3", "@SUM(A1)", "\tcmd", "\rcmd"])
+@pytest.mark.parametrize("field", ["username", "user_agent", "details"])
+def test_csv_escapes_formula_cells(field, payload):
+    row = parse_csv(rows_to_csv([make_row(**{field: payload})]))[0]
+    assert row[EXPORT_FIELDS.index(field)] == "'" + payload
+
+
+def test_ndjson_keeps_values_unescaped():
+    line = json.loads(rows_to_ndjson([make_row(details="=1+1")]))
+
+    assert line["details"] == "=1+1"
+    assert line["created_at"] == CREATED_AT.isoformat()
+    assert list(line) == EXPORT_FIELDS
+
+
+def test_csv_export_endpoint_escapes_user_agent(admin_client):
+    user_agent = '=HYPERLINK("http://evil.example","click")'
+
+    async def scenario():
+        async with admin_client("exportadmin") as client:
+            await client.post(
+                "/api/login",
+                json={"email": "exportadmin@example.com", "password": "abcd1234"},
+                headers={"user-agent": user_agent},
+            )
+            # 審計日誌由背景任務批次寫入，等待寫入完成
+            for _ in range(100):
+                response = await client.get("/api/admin/audit-logs/export", params={"format": "csv", "action": "login_success"})
+                rows = parse_csv(response.content)
+                if any(user_agent in row for row in rows[1:]) or any("'" + user_agent in row for row in rows[1:]):
+                    return response, rows
+                await asyncio.sleep(0.05)
+            raise AssertionError("審計日誌未寫入")
+
+    response, rows = asyncio.run(scenario())
+
+    assert response.headers["content-disposition"].endswith('.csv"')
+    assert rows[0] == EXPORT_FIELDS
+    user_agents = {row[EXPORT_FIELDS.index("user_agent")] for row in rows[1:]}
+    assert "'" + user_agent in user_agents and user_agent not in user_agents
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete, insert, select
+
+from app.core.audit_rollups import ROLLUP_MODELS, RollupCounts, rebuild_rollups, rollup_statements
+from app.core.database import create_session
+from app.core.retention import archive_audit_logs
+from app.models.audit_log import AuditLog
+from app.models.audit_rollup import AuditLogActionTotal
+
+
+def snapshot() -> dict:
+    """各彙總表的完整內容；SQLite 讀回的時間沒有時區，統一去除後再比較"""
+    result = {}
+    with create_session() as db:
+        for model in ROLLUP_MODELS:
+            columns = [column for column in model.__table__.columns]
+            rows = db.execute(select(*columns)).all()
+            result[model.__tablename__] = sorted(
+                tuple(value.replace(tzinfo=None) if isinstance(value, datetime) else value for value in row)
+                for row in rows
+            )
+    return result
+
+
+def write_events(events: list) -> None:
+    """與 AuditLogBuffer._flush 相同：審計日誌與彙總增量在同一個交易中寫入"""
+    counts = RollupCounts()
+    counts.add_events(events)
+    with create_session() as db:
+        db.execute(insert(AuditLog).values(events))
+        for statement, params in rollup_statements(counts):
+            db.execute(statement, params)
+        db.commit()
+
+
+@pytest.fixture
+def clean_audit_tables(database):
+    with create_session() as db:
+        db.execute(delete(AuditLog))
+        for model in ROLLUP_MODELS:
+            db.execute(delete(model))
+        db.commit()
+
+
+def make_events(now: datetime) -> list:
+    events = []
+    for days_ago, action, ip_address, count in [
+        (400, "login_failed", "10.0.0.1", 3),
+        (400, "login_success", "10.0.0.1", 1),
+        (200, "login_failed", None, 2),
+        (10, "login_failed", "10.0.0.2", 4),
+        (1, "logout", "10.0.0.3", 2),
+    ]:
+        for minute in range(count):
+            events.append({
+                "user_id": None,
+                "username": None,
+                "action": action,
+                "ip_address": ip_address,
+                "user_agent": None,
+                "details": None,
+                "created_at": now - timedelta(days=days_ago, minutes=minute),
+            })
+    return events
+
+
+def test_incremental_rollups_match_rebuild(clean_audit_tables):
+    now = datetime.now(timezone.utc)
+    events = make_events(now)
+    # 分兩批寫入，第二批累加在既有的列上
+    write_events(events[:5])
+    write_events(events[5:])
+
+    incremental = snapshot()
+    stats = rebuild_rollups()
+
+    assert stats["events"] == len(events)
+    assert snapshot() == incremental
+
+
+def test_retention_keeps_rollups_consistent(clean_audit_tables, tmp_path):
+    now = datetime.now(timezone.utc)
+    events = make_events(now)
+    write_events(events)
+
+    stats = archive_audit_logs(older_than_days=180, batch_size=3, archive_dir=tmp_path)
+
+    assert stats["archived"] == 6
+    after_retention = snapshot()
+    rebuild_rollups()
+    assert snapshot() == after_retention
+
+    # 已完全封存的 action 不留下 count 為 0 的列
+    with create_session() as db:
+        totals = dict(db.execute(select(AuditLogActionTotal.action, AuditLogActionTotal.count)).all())
+    assert totals == {"login_failed": 4, "logout": 2}
+    assert sorted(path.name for path in tmp_path.glob("*.ndjson.gz")) == sorted({
+        f"{event['created_at']:%Y-%m}.ndjson.gz" for event in events if event["created_at"] < now - timedelta(days=180)
+    })
@@ -0,0 +1,147 @@
+import asyncio
+import io
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image
+
+from app.core import images
+from app.core.images import ImageProcessor, _create_derivatives
+
+
+def png_bytes(width: int = 300, height: int = 200) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 40, 40)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "0123456789abcdef0123456789abcdef.png"
+    path.write_bytes(png_bytes())
+    return path
+
+
+def test_create_derivatives_writes_square_thumbnails(source, tmp_path):
+    created = _create_derivatives(str(source), str(tmp_path), source.stem, [64, 128], 10_000_000)
+
+    assert created == [f"{source.stem}_64.webp", f"{source.stem}_128.webp"]
+    with Image.open(tmp_path / created[1]) as thumbnail:
+        assert thumbnail.size == (128, 128) and thumbnail.format == "WEBP"
+    # 已存在的縮圖直接略過
+    assert _create_derivatives(str(source), str(tmp_path), source.stem, [64, 128], 10_000_000) == []
+    assert not list(tmp_path.glob(".*"))
+
+
+def test_concurrent_identical_uploads_do_not_collide(source, tmp_path):
+    # 多個 worker 同時處理相同內容時各自使用唯一的暫存檔
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [
+            pool.submit(_create_derivatives, str(source), str(tmp_path), source.stem, [256], 10_000_000)
+            for _ in range(4)
+        ]
+        for future in futures:
+            future.result()
+
+    assert (tmp_path / f"{source.stem}_256.webp").is_file()
+    assert not list(tmp_path.glob(".*"))
+
+
+def test_images_above_the_pixel_limit_are_rejected_before_decoding(source, tmp_path):
+    # 300x200 = 60000 像素，介於上限的一倍與兩倍之間時 Pillow 預設只發出警告
+    with pytest.raises(ValueError):
+        _create_derivatives(str(source), str(tmp_path), source.stem, [64], 40_000)
+    assert not list(tmp_path.glob("*.webp"))
+
+
+class FakeExecutor:
+    """第一個行程池模擬子行程異常結束，之後建立的直接在目前執行緒執行"""
+
+    created = []
+
+    def __init__(self, *args, **kwargs):
+        self.broken = not FakeExecutor.created
+        self.shut_down = False
+        FakeExecutor.created.append(self)
+
+    def submit(self, func, *args):
+        future = Future()
+        if self.broken:
+            future.set_exception(BrokenProcessPool("worker died"))
+        else:
+            future.set_result(func(*args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+def test_broken_pool_is_replaced_and_retried(monkeypatch, source, tmp_path):
+    FakeExecutor.created = []
+    monkeypatch.setattr(images, "ProcessPoolExecutor", FakeExecutor)
+    processor = ImageProcessor(max_workers=1, max_pixels=10_000_000)
+
+    created = asyncio.run(processor.create_derivatives(source, tmp_path, source.stem, [64]))
+
+    assert created == [f"{source.stem}_64.webp"]
+    broken, replacement = FakeExecutor.created
+    assert broken.shut_down and not replacement.shut_down
+    assert processor._executor is replacement
+
+
+@pytest.fixture
+def upload_dir(monkeypatch, tmp_path):
+    from app.api.routes import users
+
+    avatars = tmp_path / "avatars"
+    avatars.mkdir()
+    monkeypatch.setattr(users, "UPLOAD_DIR", avatars)
+    return avatars
+
+
+def upload(client, content: bytes):
+    return client.post("/api/avatar", files={"file": ("avatar.png", content, "image/png")})
+
+
+def test_upload_creates_original_and_thumbnails(admin_client, upload_dir):
+    async def scenario():
+        async with admin_client("avatarok") as client:
+            return await upload(client, png_bytes(320, 240))
+
+    response = asyncio.run(scenario())
+
+    assert response.status_code == 200, response.text
+    filename = response.json()["avatar"].rsplit("/", 1)[-1]
+    stem = filename.rsplit(".", 1)[0]
+    assert (upload_dir / filename).is_file()
+    assert {path.name for path in upload_dir.glob(f"{stem}_*.webp")} == {
+        f"{stem}_{size}.webp" for size in (64, 128, 256)
+    }
+
+
+@pytest.mark.parametrize(
+    ("name", "failure", "expected"),
+    [
+        ("avinvalid", ValueError("broken image"), 400),
+        ("avbroken", BrokenProcessPool("worker died"), BrokenProcessPool),
+        ("avoserror", OSError("disk full"), OSError),
+    ],
+)
+def test_failed_upload_leaves_no_orphaned_original(admin_client, upload_dir, monkeypatch, name, failure, expected):
+    from app.core.file_utils import image_processor
+
+    async def fail(*args, **kwargs):
+        raise failure
+
+    monkeypatch.setattr(image_processor, "create_derivatives", fail)
+
+    async def scenario():
+        async with admin_client(name) as client:
+            try:
+                return (await upload(client, png_bytes(321, 241))).status_code
+            except Exception as e:
+                return type(e)
+
+    assert asyncio.run(scenario()) == expected
+    assert list(upload_dir.iterdir()) == []
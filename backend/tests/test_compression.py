@@ -0,0 +1,27 @@
+import pytest
+
+from app.core.compression import negotiate_encoding
+
+AVAILABLE = ("zstd", "br", "gzip")
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "available", "expected"),
+    [
+        ("gzip", AVAILABLE, "gzip"),
+        ("gzip, deflate, br", AVAILABLE, "br"),
+        ("gzip, deflate, br, zstd", AVAILABLE, "zstd"),
+        ("gzip, br", ("gzip",), "gzip"),
+        ("identity", AVAILABLE, None),
+        ("br;q=0, gzip", AVAILABLE, "gzip"),
+        ("gzip;q=1.0, br;q=0.5", AVAILABLE, "gzip"),
+        # 明確列出的編碼優先於萬用字元
+        ("*;q=0.1, gzip;q=0.5", AVAILABLE, "gzip"),
+        ("*", AVAILABLE, "zstd"),
+        ("*;q=0", AVAILABLE, None),
+        ("GZIP ; q=0.8", AVAILABLE, "gzip"),
+        ("gzip;q=abc", AVAILABLE, None),
+    ],
+)
+def test_negotiate_encoding(accept_encoding, available, expected):
+    assert negotiate_encoding(accept_encoding, available) == expected
@@ -0,0 +1,42 @@
+import pytest
+
+from app.core import database
+from app.core.database import SECONDARY_POOL_SIZE, get_pool_limits
+
+
+@pytest.fixture
+def pool_settings(monkeypatch):
+    def apply(**values):
+        for key, value in values.items():
+            monkeypatch.setattr(database.settings, key, value)
+    return apply
+
+
+def test_pool_limits_without_budget(pool_settings):
+    pool_settings(DB_MAX_CONNECTIONS=0, DB_POOL_SIZE=5, DB_MAX_OVERFLOW=10)
+    assert get_pool_limits() == (5, 10)
+
+
+@pytest.mark.parametrize("is_async", [True, False])
+@pytest.mark.parametrize(("max_connections", "workers"), [(90, 9), (100, 4), (20, 3), (16, 8)])
+def test_pool_limits_stay_within_budget(pool_settings, is_async, max_connections, workers):
+    pool_settings(DB_MAX_CONNECTIONS=max_connections, WEB_CONCURRENCY=workers, DATABASE_ASYNC=is_async)
+
+    pool_size, max_overflow = get_pool_limits()
+    per_worker = pool_size + max_overflow
+    if is_async:
+        per_worker += sum(get_pool_limits(secondary=True))
+
+    assert pool_size >= 1 and max_overflow >= 0
+    assert per_worker * workers <= max_connections
+
+
+def test_pool_limits_keep_one_connection_when_budget_is_too_small(pool_settings):
+    pool_settings(DB_MAX_CONNECTIONS=4, WEB_CONCURRENCY=8, DATABASE_ASYNC=True)
+    assert get_pool_limits() == (1, 0)
+
+
+def test_async_mode_reserves_secondary_engine(pool_settings):
+    pool_settings(DB_MAX_CONNECTIONS=90, WEB_CONCURRENCY=9, DATABASE_ASYNC=True)
+    assert get_pool_limits() == (6, 3)
+    assert get_pool_limits(secondary=True) == (SECONDARY_POOL_SIZE, 0)
@@ -0,0 +1,107 @@
+import asyncio
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+from sqlalchemy import update
+from starlette.requests import Request
+
+from app.core.etag import make_etag, etag_matches
+
+
+def make_request(if_none_match=None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match is not None else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_make_etag_is_weak_and_stable():
+    updated_at = datetime(2024, 1, 1, 0, 0, 0, 500000, tzinfo=timezone.utc)
+
+    etag = make_etag("me", 7, updated_at)
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert etag == make_etag("me", 7, updated_at)
+    assert etag != make_etag("me", 8, updated_at)
+    # 微秒也納入比較
+    assert etag != make_etag("me", 7, updated_at.replace(microsecond=500001))
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        (None, False),
+        ('W/"users-3"', True),
+        ('"users-3"', True),
+        ('"other", W/"users-3"', True),
+        ("*", True),
+        ('W/"users-4"', False),
+    ],
+)
+def test_etag_matches(header, expected):
+    assert etag_matches(make_request(header), 'W/"users-3"') is expected
+
+
+def test_conditional_requests(app):
+    from app.core.database import create_session
+    from app.models.user import User
+
+    def write(*statements, add=None):
+        with create_session() as db:
+            for statement in statements:
+                db.execute(statement)
+            if add is not None:
+                db.add(add)
+            db.commit()
+
+    async def scenario():
+        results = {}
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                await client.post("/api/register", json={
+                    "username": "etagadmin", "email": "etag@example.com", "password": "abcd1234"
+                })
+                # 同步 Session 在執行緒中執行，避免阻塞事件迴圈上的審計日誌寫入而鎖住 SQLite
+                await asyncio.to_thread(
+                    write, update(User).where(User.email == "etag@example.com").values(role="admin")
+                )
+                await client.post("/api/login", json={"email": "etag@example.com", "password": "abcd1234"})
+
+                me = await client.get("/api/me")
+                results["me_304"] = (await client.get(
+                    "/api/me", headers={"if-none-match": me.headers["etag"]}
+                )).status_code
+
+                users = await client.get("/api/admin/users")
+                etag = users.headers["etag"]
+                not_modified = await client.get("/api/admin/users", headers={"if-none-match": etag})
+                results["users_304"] = (not_modified.status_code, not_modified.content, not_modified.headers["etag"])
+
+                # 透過 API 修改
+                await client.patch("/api/me", json={"bio": "changed"})
+                after_patch = await client.get("/api/admin/users", headers={"if-none-match": etag})
+                results["after_patch"] = after_patch.status_code
+                etag = after_patch.headers["etag"]
+
+                # 直接透過 ORM Session 新增，也會遞增版本
+                await asyncio.to_thread(
+                    write, add=User(username="etaguser", email="etaguser@example.com", hashed_password="x")
+                )
+                after_insert = await client.get("/api/admin/users", headers={"if-none-match": etag})
+                results["after_insert"] = after_insert.status_code
+                etag = after_insert.headers["etag"]
+
+                # ORM 批次 UPDATE 不經過 flush，同樣會遞增
+                await asyncio.to_thread(write, update(User).where(User.username == "etaguser").values(bio="bulk"))
+                results["after_bulk"] = (await client.get(
+                    "/api/admin/users", headers={"if-none-match": etag}
+                )).status_code
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert results["me_304"] == 304
+    status_code, body, etag = results["users_304"]
+    assert status_code == 304 and body == b"" and etag.startswith('W/"')
+    assert results["after_patch"] == 200
+    assert results["after_insert"] == 200
+    assert results["after_bulk"] == 200
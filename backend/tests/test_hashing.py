@@ -0,0 +1,77 @@
+import asyncio
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.hashing import PasswordHasher
+
+
+def test_process_pool_hashes_and_verifies():
+    hasher = PasswordHasher(max_workers=1, queue_depth=4)
+
+    async def scenario():
+        await hasher.warm_up()
+        hashed = await hasher.hash("abcd1234")
+        return hashed, await hasher.verify("abcd1234", hashed), await hasher.verify("wrong", hashed)
+
+    try:
+        hashed, valid, invalid = asyncio.run(scenario())
+    finally:
+        hasher.shutdown()
+
+    assert hashed.startswith("$2")
+    assert valid is True and invalid is False
+    assert hasher.stats.completed == 3 and hasher.stats.in_flight == 0
+    assert hasher._executor is None
+
+
+def test_broken_pool_is_shut_down_and_replaced():
+    hasher = PasswordHasher(max_workers=1, queue_depth=4)
+
+    async def scenario():
+        broken = hasher._get_executor()
+        # 子行程直接結束，模擬被 OOM killer 終止
+        with pytest.raises(BrokenProcessPool):
+            await hasher._run("hash", os._exit, 1)
+        assert hasher._executor is None
+        hashed = await hasher.hash("abcd1234")
+        return broken, hashed
+
+    try:
+        broken, hashed = asyncio.run(scenario())
+        assert hashed.startswith("$2")
+        assert hasher._executor is not None and hasher._executor is not broken
+        # 損壞的行程池已關閉，不再接受工作
+        with pytest.raises(RuntimeError):
+            broken.submit(os.getpid)
+    finally:
+        hasher.shutdown()
+
+
+def slow_hash(started: threading.Event, release: threading.Event):
+    started.set()
+    release.wait(5)
+    return "hashed", 0.0
+
+
+def test_requests_beyond_the_queue_are_rejected():
+    # 執行緒池模式，一個計算位置加上零個排隊位置
+    hasher = PasswordHasher(max_workers=0, queue_depth=0)
+    started, release = threading.Event(), threading.Event()
+
+    async def scenario():
+        running = asyncio.create_task(hasher._run("hash", slow_hash, started, release))
+        await asyncio.to_thread(started.wait, 5)
+        with pytest.raises(HTTPException) as exc_info:
+            await hasher.hash("abcd1234")
+        release.set()
+        return exc_info.value.status_code, await running
+
+    status_code, result = asyncio.run(scenario())
+
+    assert status_code == 503
+    assert result == "hashed"
+    assert hasher.stats.rejected == 1 and hasher.stats.completed == 1
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.login_guard import LoginGuard, MemoryWindows, StorageWindows
+
+
+def make_guard(windows=None, **overrides) -> LoginGuard:
+    options = dict(
+        enabled=True,
+        window_seconds=100,
+        max_failures_per_email=10,
+        max_failures_per_ip=50,
+        windows=MemoryWindows(1000) if windows is None else windows,
+    )
+    options.update(overrides)
+    return LoginGuard(**options)
+
+
+@pytest.mark.parametrize(
+    ("previous", "current", "elapsed", "expected"),
+    [
+        (0, 9, 30, None),
+        (5, 7, 50, None),
+        # 本視窗已達上限：剩下的 70 秒加上下個視窗本視窗次數滑出到低於上限所需的時間
+        (0, 10, 30, 70),
+        (0, 20, 30, 120),
+        # 只有上一視窗超過：等到上一視窗的次數滑出足夠比例
+        (20, 0, 0, 50),
+        (20, 5, 0, 75),
+        # 剛好在邊界時至少等待 1 秒
+        (10, 0, 0, 1),
+    ],
+)
+def test_retry_after(previous, current, elapsed, expected):
+    assert make_guard()._retry_after(previous, current, 10, elapsed) == expected
+
+
+def test_retry_after_unblocks_after_waiting():
+    guard = make_guard()
+    previous, current, limit, elapsed = 12, 4, 10, 20
+    wait = guard._retry_after(previous, current, limit, elapsed)
+
+    # 等待後（仍在同一視窗內）的估計值低於上限
+    fraction = (elapsed + wait + 1) / guard.window_seconds
+    assert fraction < 1
+    assert previous * (1 - fraction) + current < limit
+
+
+def test_locks_email_after_max_failures_and_success_clears():
+    guard = make_guard(max_failures_per_email=3)
+
+    async def scenario():
+        for _ in range(3):
+            assert await guard.check("A@x.com", "10.0.0.1") is None
+            await guard.record_failure("A@x.com", "10.0.0.1")
+
+        locked = await guard.check("a@x.com", "10.0.0.2")
+        await guard.record_success("a@x.com")
+        return locked, await guard.check("a@x.com", "10.0.0.2")
+
+    locked, after_success = asyncio.run(scenario())
+    assert locked is not None and locked >= 1
+    assert after_success is None
+    assert guard.blocked == 1
+
+
+class RecordingStorage:
+    """模擬 limits 的儲存後端，記錄每次存取所在的執行緒"""
+
+    def __init__(self):
+        self.values = {}
+        self.threads = set()
+
+    def incr(self, key, expiry):
+        self.threads.add(threading.get_ident())
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+    def get(self, key):
+        self.threads.add(threading.get_ident())
+        return self.values.get(key, 0)
+
+    def clear(self, key):
+        self.threads.add(threading.get_ident())
+        self.values.pop(key, None)
+
+
+def test_shared_storage_is_accessed_off_the_event_loop():
+    storage = RecordingStorage()
+    guard = make_guard(StorageWindows(storage, 100), max_failures_per_email=2)
+
+    async def scenario():
+        loop_thread = threading.get_ident()
+        await guard.record_failure("b@x.com", "10.0.0.1")
+        await guard.record_failure("b@x.com", "10.0.0.1")
+        locked = await guard.check("b@x.com", "10.0.0.1")
+        await guard.record_success("b@x.com")
+        return loop_thread, locked
+
+    loop_thread, locked = asyncio.run(scenario())
+    assert locked is not None
+    assert storage.threads and loop_thread not in storage.threads
@@ -0,0 +1,23 @@
+import pytest
+
+from app.core.query_stats import normalize_sql
+
+
+@pytest.mark.parametrize(
+    ("statement", "expected"),
+    [
+        ("SELECT * FROM users WHERE id = ?", "SELECT * FROM users WHERE id = ?"),
+        ("SELECT * FROM users WHERE id = %(id_1)s", "SELECT * FROM users WHERE id = ?"),
+        ("SELECT * FROM users WHERE id = $1", "SELECT * FROM users WHERE id = ?"),
+        ("SELECT * FROM users\n   WHERE  name = 'O''Brien'", "SELECT * FROM users WHERE name = ?"),
+        ("SELECT * FROM users LIMIT 10 OFFSET 20", "SELECT * FROM users LIMIT ? OFFSET ?"),
+    ],
+)
+def test_normalize_sql(statement, expected):
+    assert normalize_sql(statement) == expected
+
+
+def test_in_lists_of_different_length_are_grouped():
+    short = normalize_sql("SELECT * FROM users WHERE id IN (?, ?)")
+    long = normalize_sql("SELECT * FROM users WHERE id IN ($1, $2, $3, $4)")
+    assert short == long == "SELECT * FROM users WHERE id IN (?...)"
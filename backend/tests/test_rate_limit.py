@@ -0,0 +1,72 @@
+import threading
+from types import SimpleNamespace
+
+from limits import parse
+from limits.strategies import FixedWindowRateLimiter
+
+from app.core import rate_limit
+from app.core.rate_limit import SQLiteStorage
+
+
+def make_storage(tmp_path) -> SQLiteStorage:
+    return SQLiteStorage(f"sqlite:///{tmp_path / 'limits.db'}")
+
+
+def test_counts_are_shared_between_instances(tmp_path):
+    # 兩個實例使用同一個檔案，模擬同一台機器上的兩個 worker
+    worker_a, worker_b = make_storage(tmp_path), make_storage(tmp_path)
+
+    assert worker_a.incr("login:1.2.3.4", 60) == 1
+    assert worker_b.incr("login:1.2.3.4", 60) == 2
+    assert worker_a.get("login:1.2.3.4") == 2
+    assert worker_b.get("other") == 0
+
+    worker_b.clear("login:1.2.3.4")
+    assert worker_a.get("login:1.2.3.4") == 0
+
+
+def test_expired_window_restarts_the_count(tmp_path, monkeypatch):
+    storage = make_storage(tmp_path)
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(time=lambda: now[0]))
+
+    storage.incr("key", 10, amount=3)
+    assert storage.get_expiry("key") == 1010.0
+
+    now[0] += 11
+    assert storage.get("key") == 0
+    assert storage.incr("key", 10) == 1
+    assert storage.get_expiry("key") == 1021.0
+
+
+def test_concurrent_increments_are_atomic(tmp_path):
+    storage = make_storage(tmp_path)
+
+    def hit():
+        for _ in range(50):
+            storage.incr("key", 60)
+
+    threads = [threading.Thread(target=hit) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert storage.get("key") == 200
+
+
+def test_works_with_limits_strategies(tmp_path):
+    limiter = FixedWindowRateLimiter(make_storage(tmp_path))
+    item = parse("3/minute")
+
+    assert all(limiter.hit(item, "1.2.3.4") for _ in range(3))
+    assert not limiter.hit(item, "1.2.3.4")
+    assert limiter.hit(item, "5.6.7.8")
+
+
+def test_shared_storage_is_only_created_for_non_memory_uris(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limit.settings, "RATE_LIMIT_STORAGE_URI", "memory://")
+    assert rate_limit.create_shared_storage() is None
+
+    monkeypatch.setattr(rate_limit.settings, "RATE_LIMIT_STORAGE_URI", f"sqlite:///{tmp_path / 'shared.db'}")
+    assert isinstance(rate_limit.create_shared_storage(), SQLiteStorage)
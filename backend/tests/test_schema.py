@@ -0,0 +1,48 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app.core.schema import SUPERSEDED_INDEXES, backfill_audit_usernames, bootstrap_schema
+from app.models.user import User
+
+
+def test_bootstrap_drops_superseded_audit_log_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    # 舊版的 audit_logs：action 與 created_at 各自有單欄索引，沒有 username 欄位與複合索引
+    User.__table__.create(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE audit_logs (id INTEGER PRIMARY KEY, user_id INTEGER, action VARCHAR NOT NULL, "
+            "ip_address VARCHAR, user_agent TEXT, details TEXT, created_at DATETIME)"
+        ))
+        connection.execute(text("CREATE INDEX ix_audit_logs_action ON audit_logs (action)"))
+        connection.execute(text("CREATE INDEX ix_audit_logs_created_at ON audit_logs (created_at)"))
+
+    changes = bootstrap_schema(engine)
+
+    indexes = {index["name"] for index in inspect(engine).get_indexes("audit_logs")}
+    assert not indexes & set(SUPERSEDED_INDEXES["audit_logs"])
+    assert {"ix_audit_logs_created_at_id", "ix_audit_logs_action_created_at_id"} <= indexes
+    assert "移除已被取代的索引 ix_audit_logs_action" in changes
+    assert "新增欄位 audit_logs.username" in changes
+    # 重複執行不再有變更
+    assert bootstrap_schema(engine) == []
+
+
+def test_backfill_audit_usernames_in_batches(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'backfill.db'}")
+    bootstrap_schema(engine)
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO users (id, username, email, hashed_password, role, is_active, token_version) "
+            "VALUES (1, 'alice', 'alice@example.com', 'x', 'user', 1, 0)"
+        ))
+        connection.execute(text(
+            "INSERT INTO audit_logs (user_id, username, action) VALUES "
+            "(1, NULL, 'login_success'), (1, NULL, 'logout'), (1, 'renamed', 'login_success'), "
+            "(NULL, NULL, 'login_failed'), (99, NULL, 'login_success')"
+        ))
+
+    assert backfill_audit_usernames(engine, batch_size=1) == 2
+
+    with engine.connect() as connection:
+        usernames = connection.execute(text("SELECT username FROM audit_logs ORDER BY id")).scalars().all()
+    assert usernames == ["alice", "alice", "renamed", None, None]
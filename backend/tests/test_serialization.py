@@ -0,0 +1,50 @@
+from datetime import datetime, timezone
+
+import orjson
+import pytest
+from sqlalchemy import delete, insert, select
+
+from app.api.routes.admin import USER_LIST_COLUMNS
+from app.core.database import create_session
+from app.core.serialization import dumps
+from app.models.user import User
+from app.schemas.user import UserResponse, user_row_to_dict
+
+
+@pytest.fixture
+def user_rows(database):
+    users = [
+        {"username": "plain", "email": "plain@example.com", "hashed_password": "x"},
+        {
+            "username": "hashed", "email": "hashed@example.com", "hashed_password": "x", "bio": "簡介",
+            "avatar": "uploads/avatars/0123456789abcdef0123456789abcdef.png", "role": "admin",
+            "updated_at": datetime(2024, 5, 6, 7, 8, 9, 123456, tzinfo=timezone.utc),
+        },
+        # 舊的 UUID 檔名沒有縮圖
+        {
+            "username": "legacy", "email": "legacy@example.com", "hashed_password": "x", "is_active": False,
+            "avatar": "uploads/avatars/2f1b4c1e-8a8e-4a55-9d7e-1c1c2f0d8e11.jpg",
+        },
+    ]
+    emails = [user["email"] for user in users]
+    with create_session() as db:
+        db.execute(delete(User).where(User.email.in_(emails)))
+        db.execute(insert(User), users)
+        db.commit()
+        rows = db.execute(select(*USER_LIST_COLUMNS).where(User.email.in_(emails))).all()
+    return rows
+
+
+def test_user_row_to_dict_matches_response_model(user_rows):
+    for row in user_rows:
+        expected = UserResponse.model_validate(row).model_dump()
+        actual = user_row_to_dict(row)
+
+        assert actual == expected
+        assert list(actual) == list(expected)
+
+
+def test_direct_encoding_matches_response_model_json(user_rows):
+    for row in user_rows:
+        expected = orjson.loads(UserResponse.model_validate(row).model_dump_json())
+        assert orjson.loads(dumps(user_row_to_dict(row))) == expected
@@ -0,0 +1,147 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.static_files import FileCache, UploadFiles
+
+STEM = "0123456789abcdef0123456789abcdef"
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def upload_root(tmp_path):
+    (tmp_path / "avatars").mkdir()
+    (tmp_path / "avatars" / f"{STEM}.png").write_bytes(CONTENT)
+    (tmp_path / "avatars" / "legacy.png").write_bytes(CONTENT)
+    (tmp_path / "avatars" / f".{STEM}.part").write_bytes(b"partial")
+    return tmp_path
+
+
+def request(app, path: str, method: str = "GET", **headers) -> httpx.Response:
+    async def send():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, path, headers=headers)
+
+    return asyncio.run(send())
+
+
+@pytest.fixture(params=[False, True], ids=["disk", "memory-cache"])
+def app(request, upload_root):
+    if request.param:
+        return UploadFiles(upload_root, cache_max_bytes=64 * 1024, cache_max_file_size=8 * 1024)
+    return UploadFiles(upload_root)
+
+
+def test_content_addressed_file_is_immutable(app):
+    response = request(app, f"/avatars/{STEM}.png")
+
+    assert response.status_code == 200 and response.content == CONTENT
+    assert response.headers["etag"] == f'"{STEM}"'
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["content-length"] == str(len(CONTENT))
+
+
+def test_other_files_must_revalidate(app):
+    response = request(app, "/avatars/legacy.png")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=0, must-revalidate"
+
+
+@pytest.mark.parametrize("path", [f"/avatars/{STEM}.png", "/avatars/legacy.png"])
+def test_if_none_match_returns_304(app, path):
+    etag = request(app, path).headers["etag"]
+
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = request(app, path, **{"if-none-match": header})
+        assert response.status_code == 304 and response.content == b""
+        assert response.headers["etag"] == etag
+    assert request(app, path, **{"if-none-match": '"other"'}).status_code == 200
+
+
+@pytest.mark.parametrize(
+    ("range_header", "start", "end"),
+    [
+        ("bytes=0-99", 0, 100),
+        ("bytes=100-", 100, 1024),
+        ("bytes=-24", 1000, 1024),
+        # 超出檔案大小的結尾截到檔尾
+        ("bytes=1000-5000", 1000, 1024),
+    ],
+)
+def test_range_returns_partial_content(app, range_header, start, end):
+    response = request(app, f"/avatars/{STEM}.png", range=range_header)
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[start:end]
+    assert response.headers["content-range"] == f"bytes {start}-{end - 1}/{len(CONTENT)}"
+    assert response.headers["content-length"] == str(end - start)
+
+
+@pytest.mark.parametrize("range_header", ["bytes=5000-", "bytes=10-5", "bytes=-", "bytes=abc"])
+def test_unsatisfiable_range_returns_416(app, range_header):
+    response = request(app, f"/avatars/{STEM}.png", range=range_header)
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+@pytest.mark.parametrize("range_header", ["bytes=0-", "bytes=0-1,5-9", "items=0-5"])
+def test_full_or_unsupported_ranges_return_the_whole_file(app, range_header):
+    response = request(app, f"/avatars/{STEM}.png", range=range_header)
+    assert response.status_code == 200 and response.content == CONTENT
+
+
+def test_if_range_only_applies_range_when_etag_matches(app):
+    path = f"/avatars/{STEM}.png"
+    etag = request(app, path).headers["etag"]
+
+    matched = request(app, path, range="bytes=0-9", **{"if-range": etag})
+    changed = request(app, path, range="bytes=0-9", **{"if-range": '"stale"'})
+
+    assert matched.status_code == 206 and matched.content == CONTENT[:10]
+    assert changed.status_code == 200 and changed.content == CONTENT
+
+
+def test_head_has_headers_without_body(app):
+    response = request(app, f"/avatars/{STEM}.png", method="HEAD")
+    assert response.status_code == 200 and response.content == b""
+    assert response.headers["content-length"] == str(len(CONTENT))
+
+
+@pytest.mark.parametrize(
+    "path", [f"/avatars/.{STEM}.part", "/avatars/missing.png", "/avatars", "/../etc/passwd", "/avatars/%2e%2e/x"]
+)
+def test_hidden_missing_and_outside_paths_return_404(app, path):
+    assert request(app, path).status_code == 404
+
+
+def test_post_is_not_allowed(app):
+    response = request(app, f"/avatars/{STEM}.png", method="POST")
+    assert response.status_code == 405 and response.headers["allow"] == "GET, HEAD"
+
+
+def test_deleted_file_is_not_served_from_the_cache(upload_root):
+    app = UploadFiles(upload_root, cache_max_bytes=64 * 1024, cache_max_file_size=8 * 1024)
+    path = f"/avatars/{STEM}.png"
+    assert request(app, path).status_code == 200
+    assert app.cache.get(f"{STEM}.png") == CONTENT
+
+    (upload_root / "avatars" / f"{STEM}.png").unlink()
+
+    assert request(app, path).status_code == 404
+    assert app.cache.get(f"{STEM}.png") is None
+
+
+def test_file_cache_evicts_least_recently_used():
+    cache = FileCache(max_bytes=10, max_file_size=6)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    cache.get("a")
+    cache.put("c", b"cccc")
+    cache.put("big", b"x" * 7)
+
+    assert cache.get("b") is None and cache.get("big") is None
+    assert cache.get("a") == b"aaaa" and cache.get("c") == b"cccc"
+    assert cache.current_bytes == 8
@@ -0,0 +1,125 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.core.database import create_session
+from app.core.security import _check_token_state
+from app.core.token_versions import TokenVersionTable, token_versions
+from app.models.user import User
+
+
+def test_table_encodes_version_and_active_state():
+    table = TokenVersionTable(enabled=True, refresh_interval=60, full_reload_interval=600)
+    table.update(1, 0, True)
+    table.update(2, 5, False)
+    table.update(3, 0, False)
+
+    assert table.get(1) == (0, True)
+    assert table.get(2) == (5, False)
+    assert table.get(3) == (0, False)
+    assert table.get(4) is None
+
+    table.remove(2)
+    assert table.get(2) is None
+
+
+def test_disabled_table_stores_nothing():
+    table = TokenVersionTable(enabled=False, refresh_interval=60, full_reload_interval=600)
+    table.update(1, 0, True)
+    assert table.get(1) is None
+
+
+@pytest.mark.parametrize(
+    ("token_version", "current_version", "is_active", "expected"),
+    [
+        (1, 1, True, None),
+        (0, 1, True, 401),
+        # 停用同時遞增版本時回報 403 而不是 401
+        (0, 1, False, 403),
+        (1, 1, False, 403),
+    ],
+)
+def test_check_token_state(token_version, current_version, is_active, expected):
+    credentials_exception = HTTPException(status_code=401)
+    if expected is None:
+        _check_token_state(token_version, current_version, is_active, credentials_exception)
+        return
+
+    with pytest.raises(HTTPException) as exc_info:
+        _check_token_state(token_version, current_version, is_active, credentials_exception)
+    assert exc_info.value.status_code == expected
+
+
+def token_version_of(email: str) -> int:
+    with create_session() as db:
+        return db.scalar(select(User.token_version).where(User.email == email))
+
+
+@pytest.fixture(params=[False, True], ids=["database", "stateless"])
+def stateless(request, monkeypatch):
+    monkeypatch.setattr(token_versions, "enabled", request.param)
+    yield request.param
+    token_versions._entries.clear()
+
+
+async def login_user(app, name: str) -> tuple[httpx.AsyncClient, int]:
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    email = f"{name}@example.com"
+    await client.post("/api/register", json={"username": name, "email": email, "password": "abcd1234"})
+    await client.post("/api/login", json={"email": email, "password": "abcd1234"})
+    return client, (await client.get("/api/me")).json()["id"]
+
+
+def test_admin_actions_revoke_existing_tokens(app, admin_client, stateless):
+    suffix = "sl" if stateless else "db"
+
+    async def scenario():
+        results = {}
+        async with admin_client(f"tvadmin{suffix}") as admin:
+            user, user_id = await login_user(app, f"tvuser{suffix}")
+            try:
+                results["before"] = (await user.get("/api/me")).status_code
+
+                await admin.patch(f"/api/admin/users/{user_id}/toggle-active")
+                results["deactivated"] = (await user.get("/api/me")).status_code
+                # 重新啟用後，停用前簽發的 token 仍然失效
+                await admin.patch(f"/api/admin/users/{user_id}/toggle-active")
+                results["reactivated"] = (await user.get("/api/me")).status_code
+
+                await user.post("/api/login", json={"email": f"tvuser{suffix}@example.com", "password": "abcd1234"})
+                results["relogin"] = (await user.get("/api/me")).status_code
+                await admin.patch(
+                    f"/api/admin/users/{user_id}/reset-password", json={"new_password": "efgh5678"}
+                )
+                results["reset"] = (await user.get("/api/me")).status_code
+            finally:
+                await user.aclose()
+        return results
+
+    assert asyncio.run(scenario()) == {
+        "before": 200, "deactivated": 403, "reactivated": 401, "relogin": 200, "reset": 401,
+    }
+
+
+def test_concurrent_admin_actions_do_not_lose_version_bumps(app, admin_client):
+    async def scenario():
+        async with admin_client("tvconcurrent") as admin:
+            user, user_id = await login_user(app, "tvtarget")
+            await user.aclose()
+            before = await asyncio.to_thread(token_version_of, "tvtarget@example.com")
+
+            responses = await asyncio.gather(
+                *(admin.patch(f"/api/admin/users/{user_id}/reset-password", json={"new_password": f"abcd{i}xyz"})
+                  for i in range(3)),
+                admin.patch(f"/api/admin/users/{user_id}/toggle-active"),
+            )
+            after = await asyncio.to_thread(token_version_of, "tvtarget@example.com")
+            return [response.status_code for response in responses], before, after
+
+    statuses, before, after = asyncio.run(scenario())
+
+    assert statuses == [200, 200, 200, 200]
+    assert after == before + 4
@@ -0,0 +1,163 @@
+import asyncio
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from limits.storage import MemoryStorage
+
+from app.core import user_cache as user_cache_module
+from app.core.user_cache import UserCache
+from app.models.user import User
+
+
+def make_user(user_id: int = 1, **overrides) -> User:
+    values = dict(
+        id=user_id,
+        username=f"user{user_id}",
+        email=f"user{user_id}@example.com",
+        hashed_password="hashed",
+        avatar=None,
+        bio=None,
+        role="user",
+        is_active=True,
+        token_version=0,
+        created_at=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        updated_at=None,
+    )
+    values.update(overrides)
+    return User(**values)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_get_returns_detached_copy():
+    cache = UserCache(max_size=10, ttl_seconds=30)
+    run(cache.set(make_user(bio="hello")))
+
+    first, second = run(cache.get(1)), run(cache.get(1))
+    assert first.bio == "hello"
+    assert first is not second
+    assert cache.hits == 2
+
+
+def test_invalidate_removes_local_entry():
+    cache = UserCache(max_size=10, ttl_seconds=30)
+    run(cache.set(make_user()))
+    run(cache.invalidate(1))
+
+    assert run(cache.get(1)) is None
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    # 只替換快取模組看到的時鐘，事件迴圈仍使用真實的 time.monotonic
+    monkeypatch.setattr(user_cache_module, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    cache = UserCache(max_size=10, ttl_seconds=30)
+    run(cache.set(make_user()))
+
+    now[0] += 29
+    assert run(cache.get(1)) is not None
+    now[0] += 2
+    assert run(cache.get(1)) is None
+
+
+def test_lru_eviction():
+    cache = UserCache(max_size=2, ttl_seconds=30)
+    for user_id in (1, 2):
+        run(cache.set(make_user(user_id)))
+    run(cache.get(1))
+    run(cache.set(make_user(3)))
+
+    assert run(cache.get(2)) is None
+    assert run(cache.get(1)) is not None and run(cache.get(3)) is not None
+
+
+def test_invalidation_propagates_through_shared_storage():
+    # 兩個 UserCache 共用同一個儲存後端，模擬兩個 worker
+    storage = MemoryStorage()
+    worker_a = UserCache(max_size=10, ttl_seconds=30, shared_storage=storage)
+    worker_b = UserCache(max_size=10, ttl_seconds=30, shared_storage=storage)
+    run(worker_a.set(make_user()))
+    run(worker_b.set(make_user()))
+
+    run(worker_a.invalidate(1))
+
+    assert run(worker_b.get(1)) is None
+    # 標記存在期間，另一個 worker 從資料庫讀到的舊快照也不會寫回快取
+    run(worker_b.set(make_user(is_active=True)))
+    assert run(worker_b.get(1)) is None
+    # 其他用戶不受影響
+    run(worker_b.set(make_user(2)))
+    assert run(worker_b.get(2)) is not None
+
+
+def test_discard_does_not_broadcast():
+    storage = MemoryStorage()
+    worker_a = UserCache(max_size=10, ttl_seconds=30, shared_storage=storage)
+    worker_b = UserCache(max_size=10, ttl_seconds=30, shared_storage=storage)
+    run(worker_b.set(make_user()))
+
+    worker_a.discard(1)
+
+    assert run(worker_b.get(1)) is not None
+
+
+def test_cache_disabled_for_multiple_workers_without_shared_storage(monkeypatch):
+    monkeypatch.setattr(user_cache_module.settings, "RATE_LIMIT_STORAGE_URI", "memory://")
+    monkeypatch.setattr(user_cache_module.settings, "WEB_CONCURRENCY", 4)
+    assert not user_cache_module._create_user_cache().enabled
+
+    monkeypatch.setattr(user_cache_module.settings, "WEB_CONCURRENCY", 1)
+    assert user_cache_module._create_user_cache().enabled
+
+
+class RecordingStorage(MemoryStorage):
+    """記錄每次存取所在的執行緒"""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    def get(self, key):
+        self.threads.add(threading.get_ident())
+        return super().get(key)
+
+    def incr(self, key, expiry, amount=1):
+        self.threads.add(threading.get_ident())
+        return super().incr(key, expiry, amount)
+
+    def clear(self, key):
+        self.threads.add(threading.get_ident())
+        return super().clear(key)
+
+
+def test_shared_storage_is_accessed_off_the_event_loop():
+    storage = RecordingStorage()
+    cache = UserCache(max_size=10, ttl_seconds=30, shared_storage=storage)
+
+    async def scenario():
+        await cache.set(make_user())
+        assert await cache.get(1) is not None
+        await cache.invalidate_many([1, 2])
+        return threading.get_ident()
+
+    loop_thread = run(scenario())
+    assert storage.threads and loop_thread not in storage.threads
+
+
+def test_repeated_invalidation_extends_the_marker():
+    storage = MemoryStorage()
+    worker_a = UserCache(max_size=10, ttl_seconds=30, shared_storage=storage)
+    worker_b = UserCache(max_size=10, ttl_seconds=30, shared_storage=storage)
+
+    run(worker_a.invalidate(1))
+    first_expiry = storage.get_expiry(worker_a._marker_key(1))
+    run(asyncio.sleep(1.1))
+    run(worker_a.invalidate(1))
+
+    # 第二次失效後標記重新存活完整的 TTL，另一個 worker 在舊標記到期後仍不會寫入快照
+    assert storage.get_expiry(worker_a._marker_key(1)) > first_expiry
+    run(worker_b.set(make_user()))
+    assert run(worker_b.get(1)) is None
@@ -11,3 +11,14 @@ export const getAvatarUrl = (avatarPath) => {
 
   return `${API_CONFIG.BASE_URL}/${path}`
 }
+
+// 依顯示尺寸挑選最小但足夠清晰（2 倍像素密度）的縮圖，沒有縮圖時使用原圖
+export const pickThumbnail = (avatarPath, thumbnails, displaySize) => {
+  if (!thumbnails) return avatarPath
+
+  const target = displaySize * 2
+  const sizes = Object.keys(thumbnails).map(Number).sort((a, b) => a - b)
+  const size = sizes.find((s) => s >= target) ?? sizes[sizes.length - 1]
+
+  return size ? thumbnails[size] : avatarPath
+}